@@ -0,0 +1,242 @@
+#!/usr/bin/python3
+import os
+import re
+import sys
+import json
+import time
+import getopt
+import random
+import statistics
+import tempfile
+import platform
+import subprocess
+
+LAB = os.path.dirname(os.path.abspath(__file__))
+
+
+def generate(in_file: str, out_dir: str, count: int, seed: int) -> tuple:
+    """
+    Synthesizes a test corpus by sampling labelled lines from the training
+    file with replacement
+
+    Parameters:
+        in_file (str): file path of the labelled training lines
+        out_dir (str): folder path for the generated files
+        count (int): Number of lines to generate
+        seed (int): Seed of the sampling so runs are repeatable
+
+    Returns:
+        test_file (str): file path of the unlabelled lines
+        correct_file (str): file path of the same lines with their labels
+    """
+    with open(in_file, "r", encoding="utf-8") as file:
+        lines = [line.rstrip("\n") + "\n" for line in file if " " in line]
+
+    sampler = random.Random(seed)
+    test_file = os.path.join(out_dir, "bench.test.txt")
+    correct_file = os.path.join(out_dir, "bench.correct.txt")
+
+    with open(test_file, "w", encoding="utf-8") as test:
+        with open(correct_file, "w", encoding="utf-8") as correct:
+            for line in sampler.choices(lines, k=count):
+                correct.write(line)
+                test.write(line.split(" ", 1)[1])
+
+    return test_file, correct_file
+
+
+def measure(command: list, repeats: int = 1) -> dict:
+    """
+    Runs a command in a child process repeats times and measures it
+
+    Parameters:
+        command (list): The command and its arguments
+        repeats (int): Number of runs
+
+    Returns:
+        result (dict): Median wall time in seconds, highest peak RSS in MB and
+                       the error of the first run that failed, if any. The peak RSS
+                       is of the command's own process, without its worker processes
+    """
+    runs = []
+    peak = 0
+
+    for _ in range(repeats):
+        with tempfile.TemporaryFile() as errors:
+            start = time.perf_counter()
+            child = subprocess.Popen(command, cwd=LAB, stdout=subprocess.DEVNULL, stderr=errors)
+
+            # wait4 gives the resource usage of this child alone, so the memory of the
+            # Pool workers of a parallel configuration is not counted in its peak RSS
+            _, status, usage = os.wait4(child.pid, 0)
+            runs.append(time.perf_counter() - start)
+            peak = max(peak, usage.ru_maxrss / 1024)
+
+            if os.waitstatus_to_exitcode(status) != 0:
+                errors.seek(0)
+                return {"error": errors.read().decode("utf-8", "replace").strip().splitlines()[-1:]}
+
+    return {"seconds": round(statistics.median(runs), 4), "peak_rss_mb": round(peak, 1)}
+
+
+def accuracy(out_file: str, correct_file: str) -> float:
+    """Runs eval.py on the output file and returns the accuracy in percent"""
+
+    result = subprocess.run([sys.executable, os.path.join(LAB, "eval.py"), out_file, correct_file],
+                            capture_output=True, text=True)
+    found = re.search(r"accuracy: \d+ / \d+ \((.+)%\)", result.stdout)
+    return float(found.group(1)) if found else None
+
+
+def benchmark(in_file: str, out_dir: str, count: int, seed: int, workers: int, repeats: int = 5) -> dict:
+    """
+    Measures training and classification throughput, peak RSS and accuracy
+    of each classifier on a synthesized corpus
+
+    Every configuration is timed the same way, as whole processes. A
+    baseline run classifies an empty file and a full run the test file, so
+    classification is the full run minus the baseline, which leaves out
+    interpreter start, imports and training or loading the model. Training
+    is the baseline run, or compiling the model for the compiled
+    configurations. Each run is repeated and its median time is used. Peak
+    RSS is measured for the main process only, so the parallel
+    configurations under-report it by the memory of their workers
+
+    Parameters:
+        in_file (str): file path of the labelled training lines
+        out_dir (str): folder path for the generated and output files
+        count (int): Number of test lines to generate
+        seed (int): Seed of the corpus generator
+        workers (int): Number of processes for the parallel configurations
+        repeats (int): Number of times each run is repeated
+
+    Returns:
+        results (dict): Machine-readable results of every configuration
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    test_file, correct_file = generate(in_file, out_dir, count, seed)
+    empty_file = os.path.join(out_dir, "bench.empty.txt")
+    model_file = os.path.join(out_dir, "bench.model")
+    open(empty_file, "w").close()
+
+    with open(in_file, "r", encoding="utf-8") as file:
+        trainLines = sum(1 for _ in file)
+
+    python = sys.executable
+    configs = {
+        "dict": ["build_test_LM.py"],
+        "dict-early": ["build_test_LM.py", "-e"],
+        "dense": ["build_test_LM.py", "-m", "dense"],
+        "dense-parallel": ["build_test_LM.py", "-m", "dense", "-j", str(workers)],
+        "with-nltk": ["with-nltk.py"],
+    }
+
+    results = {
+        "version": version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "train_lines": trainLines,
+        "test_lines": count,
+        "seed": seed,
+        "workers": workers,
+        "repeats": repeats,
+        "configs": {},
+    }
+
+    for name, args in configs.items():
+        out_file = os.path.join(out_dir, "bench." + name + ".txt")
+        training = baseline = measure([python] + args + ["-b", in_file, "-t", empty_file, "-o", out_file], repeats)
+        full = measure([python] + args + ["-b", in_file, "-t", test_file, "-o", out_file], repeats)
+        results["configs"][name] = summarise(training, baseline, full, trainLines, count, out_file, correct_file)
+        print(name, results["configs"][name])
+
+    # compiled models train once and then only load the model and classify
+    out_file = os.path.join(out_dir, "bench.compiled.txt")
+    for name, args in (("compiled", []), ("compiled-parallel", ["-j", str(workers)])):
+        classify = [python, "build_test_LM.py", "-l", model_file, "-o", out_file] + args
+        training = measure([python, "build_test_LM.py", "-b", in_file, "-c", model_file] + args, repeats)
+        baseline = measure(classify + ["-t", empty_file], repeats)
+        full = measure(classify + ["-t", test_file], repeats)
+        results["configs"][name] = summarise(training, baseline, full, trainLines, count, out_file, correct_file)
+        print(name, results["configs"][name])
+
+    return results
+
+
+def summarise(training: dict, baseline: dict, full: dict, trainLines: int, testLines: int, out_file: str,
+              correct_file: str) -> dict:
+    """
+    Combines the training, baseline and full runs of one configuration into
+    its results. Classification faster than the timing noise between the
+    baseline and full runs has no throughput
+    """
+
+    for run in (training, baseline, full):
+        if "error" in run:
+            return {"error": run["error"]}
+
+    classifySeconds = full["seconds"] - baseline["seconds"]
+    measurable = classifySeconds > 0
+
+    return {
+        "train_seconds": training["seconds"],
+        "train_lines_per_second": round(trainLines / training["seconds"], 1),
+        "train_peak_rss_mb": training["peak_rss_mb"],
+        "classify_seconds": round(classifySeconds, 4),
+        "classify_lines_per_second": round(testLines / classifySeconds, 1) if measurable else None,
+        "peak_rss_mb": full["peak_rss_mb"],
+        "accuracy": accuracy(out_file, correct_file),
+    }
+
+
+def version() -> str:
+    """Returns the git revision of the code being measured, if any"""
+
+    result = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=LAB, capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -b input-file-for-building-LM -d output-directory -r results-file"
+          + " [-n test-lines] [-s seed] [-j workers] [-k repeats]")
+
+
+input_file_b = output_directory = results_file = None
+count = 100000
+seed = 0
+workers = os.cpu_count() or 1
+repeats = 5
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], "b:d:r:n:s:j:k:")
+except getopt.GetoptError:
+    usage()
+    sys.exit(2)
+
+for o, a in opts:
+    if o == "-b":
+        input_file_b = a
+    elif o == "-d":
+        output_directory = a
+    elif o == "-r":
+        results_file = a
+    elif o == "-n":
+        count = int(a)
+    elif o == "-s":
+        seed = int(a)
+    elif o == "-j":
+        workers = int(a)
+    elif o == "-k":
+        repeats = int(a)
+    else:
+        assert False, "unhandled option"
+
+if input_file_b is None or output_directory is None or results_file is None:
+    usage()
+    sys.exit(2)
+
+results = benchmark(os.path.abspath(input_file_b), os.path.abspath(output_directory), count, seed, workers, repeats)
+
+with open(results_file, "w") as out:
+    json.dump(results, out, indent=2)
@@ -10,6 +10,7 @@ import nltk
 import sys
 import getopt
 import math
+from dense_LM import build_dense_LM, test_dense_LM, save_dense_LM, load_dense_LM
 
 
 def parse(text: str) -> str:
@@ -60,10 +61,31 @@ def build_LM(in_file: str) -> dict:
     return models
 
 
-def test_LM(in_file: str, out_file: str, LM: dict) -> None:
-    """Runs the test file against the language model and outputs results into a file"""
+def slopes(LM: dict) -> dict:
+    """
+    Returns the most that one n-gram can add to the score of each language
+    over each other language, computed once per model. An n-gram missing
+    from a model adds nothing to its score
+    """
+
+    ngrams = set().union(*LM.values())
+    logs = {lang: {ngram: math.log(prob) for ngram, prob in LM[lang].items()} for lang in LM}
+
+    return {(leader, rival): max(logs[rival].get(ngram, 0) - logs[leader].get(ngram, 0) for ngram in ngrams)
+            for leader in LM for rival in LM if leader != rival}
+
+
+def test_LM(in_file: str, out_file: str, LM: dict, early: bool = False) -> None:
+    """
+    Runs the test file against the language model and outputs results into a file
+
+    With early set, stops scoring a line once the remaining n-grams can
+    neither change the leading language nor make the line "other". After a
+    check fails, the next one waits for the n-grams it estimates are needed
+    """
 
     threshold = 0.6
+    limits = slopes(LM) if early else None
 
     with open(in_file, "r", encoding="utf-8") as file:
         with open(out_file, "w", encoding="utf-8") as out:
@@ -73,8 +95,9 @@ def test_LM(in_file: str, out_file: str, LM: dict) -> None:
                 isUnknown = False
                 ngramList = extract(parse(line))
                 scores = {"malaysian": 0, "indonesian": 0, "tamil": 0}
+                nextCheck = 0 if early else len(ngramList)
 
-                for ngram in ngramList:
+                for i, ngram in enumerate(ngramList):
                     isIgnored = True
 
                     for lang in LM:
@@ -91,6 +114,14 @@ def test_LM(in_file: str, out_file: str, LM: dict) -> None:
                         isUnknown = True
                         break
 
+                    if (i >= nextCheck):
+                        steps = stepsToDecide(scores, limits, skipped, i + 1, len(ngramList), threshold)
+
+                        if (steps == 0):
+                            break
+
+                        nextCheck = i + steps
+
                 if (isUnknown):
                     out.write("other " + line)
                 else:
@@ -98,32 +129,107 @@ def test_LM(in_file: str, out_file: str, LM: dict) -> None:
                     out.write(bestGuess + " " + line)
 
 
+def stepsToDecide(scores: dict, limits: dict, skipped: int, scored: int, total: int, threshold: float) -> int:
+    """
+    Returns 0 if the remaining n-grams can no longer change the result of a
+    line, or else an estimate of how many more n-grams to score before checking again
+
+    The lead of the leader over a rival can shrink by at most
+    limits[(leader, rival)] per n-gram, so the line is decided once every
+    lead is greater than remaining * limits[(leader, rival)]. Until then
+    the leads are expected to keep growing at the rate they have so far
+    """
+
+    remaining = total - scored
+
+    # the line could still become "other" if enough of the remaining n-grams are unknown
+    steps = math.ceil(skipped + remaining - threshold * total)
+
+    leader = max(scores, key=scores.get)
+
+    for rival in scores:
+        if (rival != leader):
+            shrink = limits[(leader, rival)]
+            lead = scores[leader] - scores[rival]
+            shortfall = remaining * shrink - lead
+
+            rate = shrink + lead / scored
+
+            if (shortfall >= 0):
+                steps = max(steps, int(shortfall / rate) + 1 if rate > 0 else remaining + 1)
+
+    return max(steps, 0)
+
+
 def usage():
     print(
         "usage: "
         + sys.argv[0]
         + " -b input-file-for-building-LM -t input-file-for-testing-LM -o output-file"
+        + " [-m dict|dense] [-j workers] [-e]"
     )
-
-
-input_file_b = input_file_t = output_file = None
-try:
-    opts, args = getopt.getopt(sys.argv[1:], "b:t:o:")
-except getopt.GetoptError:
-    usage()
-    sys.exit(2)
-for o, a in opts:
-    if o == "-b":
-        input_file_b = a
-    elif o == "-t":
-        input_file_t = a
-    elif o == "-o":
-        output_file = a
+    print("compile: " + sys.argv[0] + " -b input-file-for-building-LM -c compiled-model-file"
+          + " [-l compiled-model-file-to-extend] [-j workers]")
+    print("classify: " + sys.argv[0] + " -l compiled-model-file -t input-file-for-testing-LM -o output-file"
+          + " [-j workers]")
+
+
+if __name__ == "__main__":
+    input_file_b = input_file_t = output_file = model_file_c = model_file_l = None
+    mode = "dict"
+    workers = 1
+    early = False
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "b:t:o:m:c:l:j:e")
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for o, a in opts:
+        if o == "-b":
+            input_file_b = a
+        elif o == "-t":
+            input_file_t = a
+        elif o == "-o":
+            output_file = a
+        elif o == "-m":
+            mode = a
+        elif o == "-c":
+            model_file_c = a
+        elif o == "-l":
+            model_file_l = a
+        elif o == "-j":
+            workers = int(a)
+        elif o == "-e":
+            early = True
+        else:
+            assert False, "unhandled option"
+    isCompile = input_file_b != None and model_file_c != None
+    isClassify = model_file_l != None and input_file_t != None and output_file != None and input_file_b == None
+    isBoth = input_file_b != None and input_file_t != None and output_file != None and (model_file_l == None or isCompile)
+
+    # only dense models can be classified in parallel and only dict models can stop early
+    isDict = isBoth and not isCompile and mode == "dict"
+
+    if not (isCompile or isClassify or isBoth) or mode not in ("dict", "dense") or (workers > 1 and isDict) \
+            or (early and not isDict):
+        usage()
+        sys.exit(2)
+
+    if isClassify:
+        test_dense_LM(input_file_t, output_file, load_dense_LM(model_file_l), workers=workers)
+
+    elif isCompile:
+        # compiled models are always dense; an existing model given with -l is extended
+        LM = load_dense_LM(model_file_l) if model_file_l != None else None
+        LM = build_dense_LM(input_file_b, workers, LM)
+        save_dense_LM(LM, model_file_c)
+
+        if isBoth:
+            test_dense_LM(input_file_t, output_file, LM, workers=workers)
+
+    elif mode == "dense":
+        LM = build_dense_LM(input_file_b, workers)
+        test_dense_LM(input_file_t, output_file, LM, workers=workers)
     else:
-        assert False, "unhandled option"
-if input_file_b == None or input_file_t == None or output_file == None:
-    usage()
-    sys.exit(2)
-
-LM = build_LM(input_file_b)
-test_LM(input_file_t, output_file, LM)
+        LM = build_LM(input_file_b)
+        test_LM(input_file_t, output_file, LM, early)
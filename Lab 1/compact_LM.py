@@ -0,0 +1,128 @@
+import numpy as np
+
+from dense_LM import DenseLM, encode, label
+
+
+class CompactLM:
+    """
+    Language models that only store the 4-grams actually seen in each
+    language. Every other 4-gram of the combined vocabulary has the add-1
+    smoothing floor of its language, and the seen log-probabilities are
+    quantized to unsigned integers of the given number of bits. A compact
+    model is not a DenseLM, it only has the classify method in common
+
+    Parameters:
+        LM (DenseLM): The float model to be compacted
+        bits (int): Bits per quantized log-probability, either 8 or 16
+
+    Attributes:
+        languages (list): The labels of the models
+        bits (int): Stores the input bits
+        vocab (np.ndarray): Sorted 4-grams of the combined vocabulary
+        floors (np.ndarray): Log-probability of an unseen 4-gram in each language
+        seen (list): Sorted 4-grams seen in each language
+        levels (list): Quantized log-probability of each seen 4-gram
+        lows (np.ndarray): Log-probability of level 0 in each language
+        steps (np.ndarray): Log-probability between two levels in each language
+    """
+
+    def __init__(self, LM: DenseLM, bits: int):
+        dtype = {8: np.uint8, 16: np.uint16}[bits]
+        top = (1 << bits) - 1
+
+        self.languages = list(LM.languages)
+        self.bits = bits
+        self.vocab = np.flatnonzero(LM.known).astype(np.int32)
+
+        totals = LM.counts.sum(axis=1)
+        self.floors = -np.log(totals + len(self.vocab))
+
+        self.seen = []
+        self.levels = []
+        self.lows = np.zeros(len(self.languages))
+        self.steps = np.zeros(len(self.languages))
+
+        for i, row in enumerate(LM.logprobs):
+            seen = np.flatnonzero(LM.counts[i]).astype(np.int32)
+            logprobs = row[seen]
+
+            if len(seen):
+                self.lows[i] = logprobs.min()
+                self.steps[i] = (logprobs.max() - self.lows[i]) / top
+
+            scale = self.steps[i] if self.steps[i] > 0 else 1
+            self.seen.append(seen)
+            self.levels.append(np.rint((logprobs - self.lows[i]) / scale).astype(dtype))
+
+    def nbytes(self) -> int:
+        """
+        Gets the memory used by the arrays of the model
+
+        Parameters:
+            None
+
+        Returns:
+            size (int): Size of the model in bytes
+        """
+        arrays = [self.vocab, self.floors, self.lows, self.steps] + self.seen + self.levels
+        return sum(array.nbytes for array in arrays)
+
+    def score(self, text: str, count: int) -> tuple:
+        """
+        Scores every line of text against all the languages
+
+        Parameters:
+            text (str): The newline terminated lines to be scored
+            count (int): The number of lines in text
+
+        Returns:
+            scores (np.ndarray): (languages x count) sum of log-probabilities
+            skipped (np.ndarray): Number of 4-grams of each line not in the vocabulary
+            lengths (np.ndarray): Number of 4-grams of each line
+        """
+        ngrams, lineIDs = encode(text)
+        known = isIn(ngrams, self.vocab)[0]
+        ngrams = ngrams[known]
+
+        scores = np.empty((len(self.languages), count))
+        for i in range(len(self.languages)):
+            hit, pos = isIn(ngrams, self.seen[i])
+            logprobs = np.full(len(ngrams), self.floors[i])
+            logprobs[hit] = self.lows[i] + self.levels[i][pos[hit]] * self.steps[i]
+            scores[i] = np.bincount(lineIDs[known], weights=logprobs, minlength=count)
+
+        skipped = np.bincount(lineIDs, weights=~known, minlength=count)
+        lengths = np.bincount(lineIDs, minlength=count)
+        return scores, skipped, lengths
+
+    def classify(self, lines: list) -> list:
+        """
+        Labels each line with its most likely language or "other"
+
+        Parameters:
+            lines (list): The lines to be classified
+
+        Returns:
+            labels (list): The label of each line
+        """
+        text = "\n".join(line.rstrip("\n") for line in lines)
+        return label(self.languages, *self.score(text, len(lines)))
+
+
+def isIn(ngrams: np.ndarray, table: np.ndarray) -> tuple:
+    """
+    Looks up 4-grams in a sorted table with binary search
+
+    Parameters:
+        ngrams (np.ndarray): The 4-grams to be looked up
+        table (np.ndarray): Sorted 4-grams
+
+    Returns:
+        hit (np.ndarray): Marks the 4-grams found in table
+        pos (np.ndarray): Index of each found 4-gram in table
+    """
+    pos = np.searchsorted(table, ngrams)
+    pos[pos == len(table)] = 0
+    hit = table[pos] == ngrams if len(table) else np.zeros(len(ngrams), dtype=bool)
+    return hit, pos
+
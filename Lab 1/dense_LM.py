@@ -0,0 +1,467 @@
+import io
+import os
+import struct
+from itertools import islice
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+SIZE = 4
+ALPHABET = " abcdefghijklmnopqrstuvwxyz"
+BASE = len(ALPHABET)
+VOCAB = BASE ** SIZE  # every possible 4-gram over [a-z ]
+BREAK = BASE  # code given to line breaks so that n-grams never span two lines
+THRESHOLD = 0.6
+
+# same order as the scores dict in test_LM so that ties are broken the same way
+LANGUAGES = ["malaysian", "indonesian", "tamil"]
+
+# compiled model file: magic, version, number of languages, vocabulary size, header size
+MAGIC = b"LMID"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQ")
+ALIGN = 64  # keeps the arrays aligned so they can be mapped in place
+
+# maps " " to 0, "a"-"z" to 1-26 and "\n" to BREAK; everything else is deleted like in parse
+CODES = bytes(ALPHABET.index(chr(b)) if chr(b) in ALPHABET else BREAK for b in range(256))
+DELETE = bytes(b for b in range(256) if chr(b) not in ALPHABET + "\n")
+
+
+def encode(text: str) -> tuple:
+    """
+    Extracts the 4-grams of every line in text as integers in [0, VOCAB)
+
+    Parameters:
+        text (str): One or more newline terminated lines
+
+    Returns:
+        ngrams (np.ndarray): The encoded 4-grams of all lines, in order
+        lineIDs (np.ndarray): The index of the line each 4-gram was taken from
+    """
+    data = text.lower().encode("ascii", "ignore").translate(CODES, DELETE)
+    codes = np.frombuffer(data, dtype=np.uint8).astype(np.int64)
+    count = max(len(codes) - (SIZE - 1), 0)
+
+    # number of line breaks seen before each position
+    breaks = np.concatenate(([0], np.cumsum(codes == BREAK)))
+
+    ngrams = np.zeros(count, dtype=np.int64)
+    for i in range(SIZE):
+        ngrams = ngrams * BASE + codes[i:i + count]
+
+    # drops the 4-grams that contain a line break
+    valid = breaks[SIZE:SIZE + count] == breaks[:count]
+    return ngrams[valid], breaks[:count][valid]
+
+
+class DenseLM:
+    """
+    Language models stored as a dense (languages x VOCAB) array of add-1
+    smoothed log-probabilities indexed by the encoded 4-gram, so that a batch
+    of lines is scored with array gathers and sums instead of dict lookups
+
+    Parameters:
+        languages (list): The label of each row of counts
+        counts (np.ndarray): (languages x VOCAB) raw 4-gram counts
+        known (np.ndarray): Precomputed vocabulary, derived from counts if not given
+        logprobs (np.ndarray): Precomputed log-probabilities, derived from counts if not given
+
+    Attributes:
+        languages (list): Stores the input languages
+        counts (np.ndarray): Stores the input counts
+        known (np.ndarray): Marks the 4-grams in the combined vocabulary
+        logprobs (np.ndarray): (languages x VOCAB) log-probabilities, 0 for unknown 4-grams
+    """
+
+    def __init__(self, languages: list, counts: np.ndarray,
+                 known: np.ndarray = None, logprobs: np.ndarray = None):
+        self.languages = languages
+        self.counts = counts
+        self.known = known
+        self.logprobs = logprobs
+
+        if known is None or logprobs is None:
+            self.smooth()
+
+    def smooth(self) -> None:
+        """
+        Recomputes the vocabulary and the add-1 smoothed log-probabilities
+        from the raw counts
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+        self.known = self.counts.sum(axis=0) > 0
+
+        totals = self.counts.sum(axis=1, keepdims=True)
+        self.logprobs = np.log((self.counts + 1) / (totals + np.count_nonzero(self.known)))
+        self.logprobs[:, ~self.known] = 0
+
+    def score(self, text: str, count: int) -> tuple:
+        """
+        Scores every line of text against all the languages
+
+        Parameters:
+            text (str): The newline terminated lines to be scored
+            count (int): The number of lines in text
+
+        Returns:
+            scores (np.ndarray): (languages x count) sum of log-probabilities
+            skipped (np.ndarray): Number of 4-grams of each line not in the vocabulary
+            lengths (np.ndarray): Number of 4-grams of each line
+        """
+        ngrams, lineIDs = encode(text)
+
+        scores = np.empty((len(self.languages), count))
+        for i, row in enumerate(self.logprobs):
+            scores[i] = np.bincount(lineIDs, weights=row[ngrams], minlength=count)
+
+        skipped = np.bincount(lineIDs, weights=~self.known[ngrams], minlength=count)
+        lengths = np.bincount(lineIDs, minlength=count)
+        return scores, skipped, lengths
+
+    def classify(self, lines: list) -> list:
+        """
+        Labels each line with its most likely language or "other"
+
+        Parameters:
+            lines (list): The lines to be classified
+
+        Returns:
+            labels (list): The label of each line
+        """
+        text = "\n".join(line.rstrip("\n") for line in lines)
+        return label(self.languages, *self.score(text, len(lines)))
+
+
+def label(languages: list, scores: np.ndarray, skipped: np.ndarray, lengths: np.ndarray) -> list:
+    """
+    Labels each scored line with its most likely language or "other"
+
+    Parameters:
+        languages (list): The label of each row of scores
+        scores (np.ndarray): (languages x lines) sum of log-probabilities
+        skipped (np.ndarray): Number of 4-grams of each line not in the vocabulary
+        lengths (np.ndarray): Number of 4-grams of each line
+
+    Returns:
+        labels (list): The label of each line
+    """
+    ratio = np.divide(skipped, lengths, out=np.zeros(len(lengths)), where=lengths > 0)
+    bestGuess = scores.argmax(axis=0)
+
+    return ["other" if isUnknown else languages[best]
+            for best, isUnknown in zip(bestGuess, ratio > THRESHOLD)]
+
+
+def count_range(task: tuple) -> tuple:
+    """
+    Counts the 4-grams of each language in one byte range of a training file
+
+    Parameters:
+        task (tuple): (in_file, start, end)
+
+    Returns:
+        languages (list): The languages found in the range, in order of appearance
+        counts (np.ndarray): (languages x VOCAB) 4-gram counts of the range
+    """
+    in_file, start, end = task
+    languages = []
+    labels = []
+    texts = []
+
+    with open(in_file, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+
+    for line in io.TextIOWrapper(io.BytesIO(data), encoding="utf-8"):
+        lang, text = line.split(" ", 1)
+
+        if lang not in languages:
+            languages.append(lang)
+
+        labels.append(languages.index(lang))
+        texts.append(text.rstrip("\n"))
+
+    ngrams, lineIDs = encode("\n".join(texts))
+
+    # counts every (language, 4-gram) pair with a single bincount
+    cells = np.array(labels, dtype=np.int64)[lineIDs] * VOCAB + ngrams
+    counts = np.bincount(cells, minlength=len(languages) * VOCAB)
+    return languages, counts.reshape(len(languages), VOCAB)
+
+
+def merge_counts(languages: list, counts: np.ndarray, newLanguages: list, newCounts: np.ndarray) -> tuple:
+    """
+    Adds the counts of newLanguages into counts, appending a row for every
+    language that is not in languages yet
+
+    Parameters:
+        languages (list): The languages of counts
+        counts (np.ndarray): (languages x VOCAB) counts to be added to
+        newLanguages (list): The languages of newCounts
+        newCounts (np.ndarray): (newLanguages x VOCAB) counts to be added
+
+    Returns:
+        languages (list): The combined languages
+        counts (np.ndarray): The combined counts
+    """
+    added = [lang for lang in newLanguages if lang not in languages]
+
+    if added:
+        languages = languages + added
+        counts = np.concatenate((counts, np.zeros((len(added), VOCAB), dtype=np.int64)))
+
+    for lang, row in zip(newLanguages, newCounts):
+        counts[languages.index(lang)] += row
+
+    return languages, counts
+
+
+def build_dense_LM(in_file: str, workers: int = 1, LM: DenseLM = None, chunksize: int = 1 << 22) -> DenseLM:
+    """
+    Parses the input file and builds the dense language model
+
+    Byte ranges of the file are counted independently (in a pool of worker
+    processes if workers > 1) and their counts are then summed. The raw
+    counts are kept in the model, so passing a previous model as LM adds
+    the new lines, and any new languages, to it without recounting the
+    lines it was built from
+
+    Parameters:
+        in_file (str): file path of the labelled training lines
+        workers (int): Number of worker processes used for counting
+        LM (DenseLM): Model to be extended, None to start from empty counts
+        chunksize (int): Approximate size of each byte range in bytes
+
+    Returns:
+        LM (DenseLM): The new model
+    """
+    if LM is None:
+        languages = list(LANGUAGES)
+        counts = np.zeros((len(languages), VOCAB), dtype=np.int64)
+    else:
+        languages = list(LM.languages)
+        counts = np.array(LM.counts, dtype=np.int64)  # copies the counts out of a mapped file
+
+    tasks = [(in_file, start, end) for start, end in split_file(in_file, chunksize)]
+
+    if workers > 1:
+        with Pool(workers) as pool:
+            for newLanguages, newCounts in pool.imap(count_range, tasks):
+                languages, counts = merge_counts(languages, counts, newLanguages, newCounts)
+    else:
+        for newLanguages, newCounts in map(count_range, tasks):
+            languages, counts = merge_counts(languages, counts, newLanguages, newCounts)
+
+    return DenseLM(languages, counts)
+
+
+def save_dense_LM(LM: DenseLM, model_file: str) -> None:
+    """
+    Writes the compiled model into a versioned binary file that
+    load_dense_LM can map into memory without parsing it
+
+    Layout: header and language labels padded to ALIGN bytes, followed by
+    the counts (int64), the log-probabilities (float64) and the vocabulary
+    (uint8) arrays back to back
+
+    Parameters:
+        LM (DenseLM): The model to be saved
+        model_file (str): file path for the compiled model
+
+    Returns:
+        None
+    """
+    names = "\n".join(LM.languages).encode("utf-8")
+    size = -(-(HEADER.size + len(names)) // ALIGN) * ALIGN
+
+    with open(model_file, "wb") as out:
+        out.write(HEADER.pack(MAGIC, VERSION, len(LM.languages), VOCAB, size))
+        out.write(names.ljust(size - HEADER.size, b"\0"))
+
+        for array, dtype in ((LM.counts, np.int64), (LM.logprobs, np.float64), (LM.known, np.uint8)):
+            out.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+
+def load_dense_LM(model_file: str) -> DenseLM:
+    """
+    Memory-maps a model written by save_dense_LM. The arrays are read-only
+    views of the file, so every process that loads the same file shares one
+    copy of it in the page cache
+
+    Parameters:
+        model_file (str): file path for the compiled model
+
+    Returns:
+        LM (DenseLM): The model backed by the mapped file
+    """
+    with open(model_file, "rb") as file:
+        magic, version, count, vocab, size = HEADER.unpack(file.read(HEADER.size))
+        names = file.read(size - HEADER.size).rstrip(b"\0").decode("utf-8")
+
+    if magic != MAGIC or version != VERSION or vocab != VOCAB:
+        raise ValueError(model_file + " is not a version " + str(VERSION) + " compiled model")
+
+    shape = (count, VOCAB)
+    counts = np.memmap(model_file, dtype=np.int64, mode="r", offset=size, shape=shape)
+    size += counts.nbytes
+    logprobs = np.memmap(model_file, dtype=np.float64, mode="r", offset=size, shape=shape)
+    size += logprobs.nbytes
+    known = np.memmap(model_file, dtype=np.bool_, mode="r", offset=size, shape=(VOCAB,))
+
+    return DenseLM(names.split("\n"), counts, known, logprobs)
+
+
+def test_dense_LM(in_file: str, out_file: str, LM: DenseLM, batchsize: int = 20000, workers: int = 1) -> None:
+    """
+    Classifies the test file in batches of lines and outputs results into a file
+
+    Only a DenseLM can be shared with worker processes, any other model
+    with a classify method, such as a CompactLM, is run in this process
+    """
+
+    if workers > 1 and isinstance(LM, DenseLM):
+        return test_parallel_LM(in_file, out_file, LM, workers, batchsize)
+
+    with open(in_file, "r", encoding="utf-8") as file:
+        with open(out_file, "w", encoding="utf-8") as out:
+            classify_lines(file, out, LM, batchsize)
+
+
+def classify_lines(file: io.TextIOBase, out: io.TextIOBase, LM: DenseLM, batchsize: int) -> None:
+    """
+    Classifies every line read from file in batches of lines, writing each
+    batch as soon as it is labeled
+
+    Parameters:
+        file (io.TextIOBase): Handle of the lines to be classified
+        out (io.TextIOBase): Handle each line is written to, prefixed with its label
+        LM (DenseLM): The model used for classification
+        batchsize (int): Number of lines scored at once
+
+    Returns:
+        None
+    """
+    while (lines := list(islice(file, batchsize))):
+        out.writelines(label + " " + line for label, line in zip(LM.classify(lines), lines))
+
+
+def split_file(in_file: str, chunksize: int) -> list:
+    """
+    Splits a file into byte ranges of about chunksize bytes that each
+    start at the beginning of a line
+
+    Parameters:
+        in_file (str): file path of the file to be split
+        chunksize (int): Approximate size of each range in bytes
+
+    Returns:
+        ranges (list): (start, end) byte offsets of each range, in file order
+    """
+    ranges = []
+    start = 0
+    size = os.path.getsize(in_file)
+
+    with open(in_file, "rb") as file:
+        while start < size:
+            file.seek(min(start + chunksize, size))
+            file.readline()  # moves the end of the range to the start of the next line
+            end = min(file.tell(), size)
+            ranges.append((start, end))
+            start = end
+
+    return ranges
+
+
+# model of each worker process, attached to the shared memory block by attach_worker
+workerLM = None
+workerMemory = None
+
+
+def attach_worker(name: str, languages: list) -> None:
+    """
+    Initialises a worker process with a model whose arrays are views of the
+    shared memory block created by test_parallel_LM, so the model is never
+    pickled or copied into the worker
+
+    Parameters:
+        name (str): Name of the shared memory block
+        languages (list): Labels of the model
+
+    Returns:
+        None
+    """
+    global workerLM, workerMemory
+
+    workerMemory = shared_memory.SharedMemory(name=name)
+    logprobs = np.ndarray((len(languages), VOCAB), dtype=np.float64, buffer=workerMemory.buf)
+    known = np.ndarray((VOCAB,), dtype=np.bool_, buffer=workerMemory.buf, offset=logprobs.nbytes)
+    workerLM = DenseLM(languages, None, known, logprobs)
+
+
+def classify_range(task: tuple) -> str:
+    """
+    Classifies the lines in one byte range of the test file
+
+    Parameters:
+        task (tuple): (in_file, start, end, batchsize)
+
+    Returns:
+        output (str): Each line of the range prefixed with its label
+    """
+    in_file, start, end, batchsize = task
+
+    with open(in_file, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+
+    # decodes the same way as reading the file in text mode would
+    output = io.StringIO()
+    classify_lines(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8"), output, workerLM, batchsize)
+    return output.getvalue()
+
+
+def test_parallel_LM(in_file: str, out_file: str, LM: DenseLM, workers: int,
+                     batchsize: int = 20000, chunksize: int = 1 << 22) -> None:
+    """
+    Classifies byte ranges of the test file in a pool of worker processes
+    that share the model through shared memory, and outputs the results
+    into a file in the original line order
+
+    Parameters:
+        in_file (str): file path of the test file
+        out_file (str): file path for the results
+        LM (DenseLM): The model used for classification
+        workers (int): Number of worker processes
+        batchsize (int): Number of lines scored at once by a worker
+        chunksize (int): Approximate size of each byte range in bytes
+
+    Returns:
+        None
+    """
+    size = LM.logprobs.nbytes + LM.known.nbytes
+    memory = shared_memory.SharedMemory(create=True, size=size)
+
+    try:
+        logprobs = np.ndarray(LM.logprobs.shape, dtype=np.float64, buffer=memory.buf)
+        known = np.ndarray(LM.known.shape, dtype=np.bool_, buffer=memory.buf, offset=logprobs.nbytes)
+        logprobs[:] = LM.logprobs
+        known[:] = LM.known
+
+        tasks = [(in_file, start, end, batchsize) for start, end in split_file(in_file, chunksize)]
+
+        with Pool(workers, initializer=attach_worker, initargs=(memory.name, LM.languages)) as pool:
+            with open(out_file, "w", encoding="utf-8") as out:
+                # imap returns the ranges in submission order
+                for output in pool.imap(classify_range, tasks):
+                    out.write(output)
+
+        del logprobs, known  # releases the views before the block is closed
+
+    finally:
+        memory.close()
+        memory.unlink()
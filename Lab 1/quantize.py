@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+import re
+import sys
+import getopt
+import subprocess
+import os
+
+from dense_LM import build_dense_LM, test_dense_LM
+from compact_LM import CompactLM
+
+
+def evaluate(out_file: str, correct_file: str) -> tuple:
+    """Runs eval.py on the output file and returns the number of correct and total lines"""
+
+    evaluator = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval.py")
+    result = subprocess.run([sys.executable, evaluator, out_file, correct_file],
+                            capture_output=True, text=True, check=True)
+    correct, total = re.search(r"accuracy: (\d+) / (\d+)", result.stdout).groups()
+    return int(correct), int(total)
+
+
+def compare(in_file_b: str, in_file_t: str, correct_file: str, out_prefix: str) -> None:
+    """
+    Classifies the test file with the float model and with its 16 and 8 bit
+    compact models, and reports the size of each model and how its eval.py
+    accuracy differs from the float model
+
+    Parameters:
+        in_file_b (str): file path for building the language model
+        in_file_t (str): file path for testing the language model
+        correct_file (str): file path of the correct labels for eval.py
+        out_prefix (str): prefix of the output file written for each model
+
+    Returns:
+        None
+    """
+    LM = build_dense_LM(in_file_b)
+    models = [("float", LM, LM.logprobs.nbytes + LM.known.nbytes)]
+
+    for bits in (16, 8):
+        compact = CompactLM(LM, bits)
+        models.append((str(bits) + "-bit", compact, compact.nbytes()))
+
+    baseline = None
+
+    for name, model, size in models:
+        out_file = out_prefix + "." + name + ".txt"
+        test_dense_LM(in_file_t, out_file, model)
+        correct, total = evaluate(out_file, correct_file)
+        accuracy = correct * 100.0 / total
+
+        if baseline is None:
+            baseline = accuracy
+
+        print("%-7s %10d bytes  accuracy: %s / %s (%s%%)  change: %+.2f%%"
+              % (name, size, correct, total, round(accuracy, 2), accuracy - baseline))
+
+
+def usage():
+    print("usage: " + sys.argv[0]
+          + " -b input-file-for-building-LM -t input-file-for-testing-LM -c file-containing-correct-results"
+          + " -o output-file-prefix")
+
+
+input_file_b = input_file_t = correct_file = output_prefix = None
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], "b:t:c:o:")
+except getopt.GetoptError:
+    usage()
+    sys.exit(2)
+
+for o, a in opts:
+    if o == "-b":
+        input_file_b = a
+    elif o == "-t":
+        input_file_t = a
+    elif o == "-c":
+        correct_file = a
+    elif o == "-o":
+        output_prefix = a
+    else:
+        assert False, "unhandled option"
+
+if input_file_b is None or input_file_t is None or correct_file is None or output_prefix is None:
+    usage()
+    sys.exit(2)
+
+compare(input_file_b, input_file_t, correct_file, output_prefix)
@@ -0,0 +1,241 @@
+#!/usr/bin/python3
+import os
+import sys
+import getopt
+import signal
+import asyncio
+
+from dense_LM import load_dense_LM, DenseLM
+
+
+class Batcher:
+    """
+    Merges the lines submitted by concurrent connections into micro-batches
+    so that each batch is scored with one call to the model
+
+    Parameters:
+        LM (DenseLM): The model used for classification
+        batchsize (int): Max number of lines in a batch
+        delay (float): Max seconds the first line of a batch waits for more lines
+
+    Attributes:
+        LM (DenseLM): Stores the input model
+        batchsize (int): Stores the input batchsize
+        delay (float): Stores the input delay
+        queue (asyncio.Queue): Lines waiting to be scored with the future of their label
+    """
+
+    def __init__(self, LM: DenseLM, batchsize: int, delay: float):
+        self.LM = LM
+        self.batchsize = batchsize
+        self.delay = delay
+        self.queue = asyncio.Queue()
+
+    def submit(self, line: str) -> asyncio.Future:
+        """
+        Queues a line to be classified in the next batch
+
+        Parameters:
+            line (str): The line to be classified
+
+        Returns:
+            label (asyncio.Future): Resolves to the label of the line
+        """
+        label = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((line, label))
+        return label
+
+    async def run(self) -> None:
+        """
+        Scores the queued lines batch by batch until cancelled
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.delay
+
+            # keeps collecting lines until the batch is full or the first line has waited long enough
+            while len(batch) < self.batchsize:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                labels = self.LM.classify([line for line, _ in batch])
+
+            except Exception as error:
+                # fails the lines of this batch only, the next batches are still scored
+                for _, label in batch:
+                    if not label.done():
+                        label.set_exception(error)
+
+                continue
+
+            for (_, label), result in zip(batch, labels):
+                if not label.done():
+                    label.set_result(result)
+
+
+async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, batcher: Batcher) -> None:
+    """
+    Answers every line sent on one connection with the label and the line,
+    in the format of test_LM. Lines are submitted as soon as they arrive, so
+    a client may send a whole batch before reading the answers. A line that
+    could not be classified is answered with the label "error", and a line
+    longer than the limit of the reader is answered with "error line too
+    long" before the connection is closed
+
+    Parameters:
+        reader (asyncio.StreamReader): Lines sent by the client
+        writer (asyncio.StreamWriter): Answers to the client
+        batcher (Batcher): Collects the lines into micro-batches
+
+    Returns:
+        None
+    """
+    pending = asyncio.Queue()
+
+    async def answer():
+        # answers in the order the lines were received
+        while (item := await pending.get()) is not None:
+            line, label = item
+
+            try:
+                result = await label
+            except Exception:
+                result = "error"
+
+            writer.write((result + " " + line).encode("utf-8"))
+            await writer.drain()
+
+    answering = asyncio.create_task(answer())
+    loop = asyncio.get_running_loop()
+
+    try:
+        while True:
+            try:
+                data = await reader.readline()
+
+            except ValueError:
+                # the rest of an overlong line cannot be told apart from the next line, so reading stops
+                failed = loop.create_future()
+                failed.set_result("error")
+                pending.put_nowait(("line too long\n", failed))
+                break
+
+            if not data:
+                break
+
+            line = data.decode("utf-8", "replace").replace("\r\n", "\n")
+
+            if not line.endswith("\n"):
+                line += "\n"
+
+            pending.put_nowait((line, batcher.submit(line)))
+
+        pending.put_nowait(None)
+        await answering
+
+    except ConnectionError:
+        pass
+
+    finally:
+        answering.cancel()
+        writer.close()
+
+
+async def run_server(model_file: str, socket_file: str, port: int, batchsize: int, delay: float) -> None:
+    """
+    Loads the compiled model once and serves classification requests on a
+    Unix socket or on a TCP port of localhost until SIGINT or SIGTERM
+
+    Parameters:
+        model_file (str): file path of the compiled model
+        socket_file (str): file path of the Unix socket, None to use TCP
+        port (int): TCP port on localhost
+        batchsize (int): Max number of lines in a batch
+        delay (float): Max seconds the first line of a batch waits for more lines
+
+    Returns:
+        None
+    """
+    batcher = Batcher(load_dense_LM(model_file), batchsize, delay)
+    batching = asyncio.create_task(batcher.run())
+
+    def handle(reader, writer):
+        return serve(reader, writer, batcher)
+
+    if socket_file is not None:
+        server = await asyncio.start_unix_server(handle, path=socket_file)
+    else:
+        server = await asyncio.start_server(handle, host="127.0.0.1", port=port)
+
+    print("serving on", socket_file if socket_file is not None else "127.0.0.1:" + str(port), flush=True)
+
+    loop = asyncio.get_running_loop()
+    stopped = loop.create_future()
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, lambda: stopped.done() or stopped.set_result(None))
+
+    try:
+        async with server:
+            await stopped
+    finally:
+        batching.cancel()
+
+        if socket_file is not None and os.path.exists(socket_file):
+            os.remove(socket_file)
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -l compiled-model-file (-s unix-socket-file | -p port)"
+          + " [-n max-batch-lines] [-w max-batch-wait-ms]")
+
+
+model_file = socket_file = port = None
+batchsize = 1024
+delay = 0.002
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], "l:s:p:n:w:")
+except getopt.GetoptError:
+    usage()
+    sys.exit(2)
+
+for o, a in opts:
+    if o == "-l":
+        model_file = a
+    elif o == "-s":
+        socket_file = a
+    elif o == "-p":
+        port = int(a)
+    elif o == "-n":
+        batchsize = int(a)
+    elif o == "-w":
+        delay = float(a) / 1000
+    else:
+        assert False, "unhandled option"
+
+if model_file is None or (socket_file is None) == (port is None):
+    usage()
+    sys.exit(2)
+
+asyncio.run(run_server(model_file, socket_file, port, batchsize, delay))
+print("server stopped")
@@ -50,7 +50,7 @@ def test_LM(in_file: str, out_file: str, LM: dict) -> None:
             for line in file:
                 skipped = 0
                 isUnknown = False
-                ngrams = list(nltk.ngrams(parse(text), 4))
+                ngrams = list(nltk.ngrams(parse(line), 4))
                 scores = {"malaysian": 0, "indonesian": 0, "tamil": 0}
 
                 for ngram in ngrams:
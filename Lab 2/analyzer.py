@@ -0,0 +1,132 @@
+import os
+import pickle
+import nltk
+import string
+from collections import OrderedDict
+from typing import Iterator
+from nltk.stem import PorterStemmer
+
+# changed whenever the analyzer turns tokens into different terms, so the
+# stems and terms cached by an older analyzer are not reused
+VERSION = 1
+
+
+class Analyzer:
+    """
+    Turns tokens into terms for both the index and the queries. Tokens
+    without any value are filtered out and the rest are case-folded and
+    stemmed, with the stem of each token memoized as stemming is pure. The
+    cache file is only loaded if it was saved by an analyzer of the same
+    version, using the same NLTK version and stemmer mode
+
+    Parameters:
+        cachesize (int): Max number of tokens whose stems are memoized
+        cachefile (str): file path the memoized stems are loaded from and saved to, None to not persist them
+
+    Attributes:
+        porter (PorterStemmer): Used to perform stemming on tokens
+        bannedTokens (list): Tokens that are not indexed on top of punctuation
+        stems (OrderedDict): Memoized stems of tokens, oldest first
+        version (tuple): Identifies the terms made by the analyzer
+        cachesize (int): Stores the input cachesize
+        cachefile (str): Stores the input cachefile
+    """
+
+    def __init__(self, cachesize: int = 1 << 18, cachefile: str = None):
+        self.porter = PorterStemmer()
+        self.bannedTokens = ["``", "--", "''"]
+        self.stems = OrderedDict()
+        self.cachesize = cachesize
+        self.cachefile = cachefile
+        self.version = (VERSION, nltk.__version__, self.porter.mode)
+
+        if cachefile is not None and os.path.exists(cachefile):
+            with open(cachefile, "rb") as f:
+                cache = pickle.load(f)
+
+            # a cache of another version may hold different stems, so it is ignored
+            if isinstance(cache, dict) and cache.get("version") == self.version:
+                self.update(cache["stems"])
+
+    def analyze(self, tokenList: list) -> Iterator[str]:
+        """
+        Gets the terms of the tokens that have any value
+
+        Parameters:
+            tokenList (list): List of tokens from the document parsed
+
+        Returns:
+            terms (Iterator): The stemmed terms in token order
+        """
+        for token in tokenList:
+            if self.isIndexed(token):
+                yield self.stem(token)
+
+    def isIndexed(self, token: str) -> bool:
+        """
+        Checks if a token has any value
+
+        Parameters:
+            token (str): The token
+
+        Returns:
+            indexed (bool): False for punctuation, banned tokens and ellipses
+        """
+        return not (token in string.punctuation or token in self.bannedTokens or ".." in token)
+
+    def stem(self, token: str) -> str:
+        """
+        Case-folds and stems a token, memoizing the stem. Once the cache is
+        full the oldest stem is dropped for every new one
+
+        Parameters:
+            token (str): The token
+
+        Returns:
+            term (str): The stem of the lower-cased token
+        """
+        term = self.stems.get(token)
+
+        if term is None:
+            term = self.porter.stem(token.lower())
+
+            if len(self.stems) >= self.cachesize:
+                # popitem is constant time, unlike finding the first key of a dict after deletions
+                self.stems.popitem(last=False)
+
+            self.stems[token] = term
+
+        return term
+
+    def update(self, stems: dict) -> None:
+        """
+        Adds stems memoized elsewhere, such as by another process, within the size of the cache
+
+        Parameters:
+            stems (dict): Tokens and their stems
+
+        Returns:
+            None
+        """
+        for token, term in stems.items():
+            if len(self.stems) >= self.cachesize:
+                break
+
+            self.stems.setdefault(token, term)
+
+    def save(self) -> None:
+        """
+        Writes the memoized stems and the version of the analyzer to the
+        cache file, if there is one, so the next build starts with them
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+        if self.cachefile is None:
+            return
+
+        with open(self.cachefile, "wb") as f:
+            pickle.dump({"version": self.version, "stems": self.stems}, f)
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from typing import Hashable
+
+
+class LRUCache:
+    """
+    Cache that evicts the least recently used entries once the sizes of
+    its values exceed the capacity
+
+    Parameters:
+        capacity (int): Max bytes of the cached values
+
+    Attributes:
+        entries (OrderedDict): Cached values and their sizes, least recently used first
+        capacity (int): Stores the input capacity
+        used (int): Bytes of the cached values
+        hits (int): Number of lookups that found their key
+        misses (int): Number of lookups that did not find their key
+    """
+
+    def __init__(self, capacity: int):
+        self.entries = OrderedDict()
+        self.capacity = capacity
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> any:
+        """
+        Looks up a key and marks it as the most recently used
+
+        Parameters:
+            key (Hashable): The key to be looked up
+
+        Returns:
+            value (any): The cached value, None if key is not cached
+        """
+
+        if key not in self.entries:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key][0]
+
+    def put(self, key: Hashable, value: any, size: int) -> None:
+        """
+        Caches a value, evicting the least recently used values until it fits
+
+        Parameters:
+            key (Hashable): The key of the value
+            value (any): The value to be cached
+            size (int): Bytes used by the value
+
+        Returns:
+            None
+        """
+
+        if size > self.capacity:
+            return
+
+        if key in self.entries:
+            self.used -= self.entries.pop(key)[1]
+
+        self.entries[key] = (value, size)
+        self.used += size
+
+        while self.used > self.capacity:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.used -= evicted
@@ -0,0 +1,444 @@
+import sys
+from array import array
+from bisect import bisect_left
+from typing import BinaryIO, Iterator, Tuple, Union
+from itertools import accumulate
+
+# docIDs per block of a posting list, the blocks are decoded on their own
+BLOCK = 128
+
+# bytes read to get the number of docIDs and of blocks of a posting list
+HEAD = 10
+
+# a posting list is stored as a bitmap when at least 1 in DENSITY docIDs up to its last docID is in it
+DENSITY = 8
+
+# bytes of a bitmap container, which covers 2^16 docIDs
+CONTAINER = 1 << 13
+
+# set bits of every byte value, lowest first
+BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+def encodeVB(numbers: list) -> bytearray:
+    """
+    Encodes non-negative integers with variable byte encoding. Each number
+    is split into 7 bit groups, most significant first, and the high bit
+    marks the last byte of a number
+
+    Parameters:
+        numbers (list): The numbers to be encoded
+
+    Returns:
+        encoded (bytearray): The encoded numbers
+    """
+    encoded = bytearray()
+
+    for number in numbers:
+        groups = [number & 0x7F | 0x80]
+        number >>= 7
+
+        while number:
+            groups.append(number & 0x7F)
+            number >>= 7
+
+        encoded.extend(reversed(groups))
+
+    return encoded
+
+
+def decodeVB(data: bytes, start: int = 0, count: int = -1) -> Iterator[int]:
+    """
+    Decodes variable byte encoded integers
+
+    Parameters:
+        data (bytes): The encoded numbers
+        start (int): Byte offset of the first number to decode
+        count (int): Number of numbers to decode, -1 to decode until the end of data
+
+    Returns:
+        numbers (Iterator): The decoded numbers
+    """
+    number = 0
+
+    for i in range(start, len(data)):
+        if count == 0:
+            return
+
+        byte = data[i]
+
+        if byte & 0x80:
+            yield number << 7 | byte & 0x7F
+            number = 0
+            count -= 1
+        else:
+            number = number << 7 | byte
+
+
+def readVB(data: bytes, start: int) -> Tuple[int, int]:
+    """
+    Decodes a single variable byte encoded integer
+
+    Parameters:
+        data (bytes): The encoded numbers
+        start (int): Byte offset of the number
+
+    Returns:
+        number (int): The decoded number
+        end (int): Byte offset after the number
+    """
+    number = 0
+
+    while not data[start] & 0x80:
+        number = number << 7 | data[start]
+        start += 1
+
+    return number << 7 | data[start] & 0x7F, start + 1
+
+
+def encodePostings(docIDs: list) -> bytearray:
+    """
+    Encodes a sorted posting list in blocks of BLOCK docIDs. The number of
+    docIDs, whose lowest bit is 0 to tell it apart from a bitmap, and the
+    number of blocks come first, variable byte encoded. Then comes the skip
+    table with the first docID, the last docID and the byte offset of every
+    block, as columns of little endian unsigned 32 bit integers, and then
+    the gaps between the docIDs of each block, variable byte encoded
+
+    Parameters:
+        docIDs (list): The sorted docIDs
+
+    Returns:
+        encoded (bytearray): The encoded posting list
+    """
+    firsts = array("I")
+    lasts = array("I")
+    offsets = array("I")
+    gaps = bytearray()
+
+    for i in range(0, len(docIDs), BLOCK):
+        block = docIDs[i:i + BLOCK]
+        firsts.append(block[0])
+        lasts.append(block[-1])
+        offsets.append(len(gaps))
+        gaps.extend(encodeVB([docID - previous for previous, docID in zip(block, block[1:])]))
+
+    table = firsts + lasts + offsets
+
+    if sys.byteorder == "big":
+        table.byteswap()  # the file is little endian
+
+    return encodeVB([len(docIDs) << 1, len(firsts)]) + table.tobytes() + gaps
+
+
+def encodeBitmap(docIDs: list) -> bytearray:
+    """
+    Encodes a sorted posting list as a bitmap split into containers of 2^16
+    docIDs, in the style of Roaring bitmaps. After the number of docIDs, with
+    its lowest bit set, each non-empty container is stored as its index and
+    length followed by its bytes, without the trailing zero bytes
+
+    Parameters:
+        docIDs (list): The sorted docIDs
+
+    Returns:
+        encoded (bytearray): The encoded posting list
+    """
+    encoded = encodeVB([len(docIDs) << 1 | 1])
+    data = toBitmap(docIDs).to_bytes((docIDs[-1] >> 3) + 1 if docIDs else 0, "little")
+
+    for start in range(0, len(data), CONTAINER):
+        container = data[start:start + CONTAINER].rstrip(b"\0")
+
+        if container:
+            encoded.extend(encodeVB([start // CONTAINER, len(container)]))
+            encoded.extend(container)
+
+    return encoded
+
+
+def decodePostings(data: bytes) -> Union[array, int]:
+    """
+    Decodes an encoded posting list
+
+    Parameters:
+        data (bytes): The encoded posting list
+
+    Returns:
+        docIDs (Union[array, int]): The docIDs in ascending order, or the
+                                    bitmap of the docIDs if it is stored as one
+    """
+    header, position = readVB(data, 0)
+
+    if not header & 1:
+        return array("I", streamPostings(data))
+
+    bitmap = bytearray()
+
+    while position < len(data):
+        index, position = readVB(data, position)
+        length, position = readVB(data, position)
+        bitmap.extend(bytes(index * CONTAINER - len(bitmap)))
+        bitmap.extend(data[position:position + length])
+        position += length
+
+    return int.from_bytes(bitmap, "little")
+
+
+def streamPostings(data: bytes) -> Iterator[int]:
+    """
+    Decodes the docIDs of an encoded posting list one at a time
+
+    Parameters:
+        data (bytes): The encoded posting list
+
+    Returns:
+        docIDs (Iterator): The docIDs in ascending order
+    """
+    header, position = readVB(data, 0)
+
+    if header & 1:
+        # yields the docIDs of each container byte by byte, without building the whole list
+        while position < len(data):
+            index, position = readVB(data, position)
+            length, position = readVB(data, position)
+            base = index * CONTAINER - position
+
+            for i in range(position, position + length):
+                if data[i]:
+                    yield from ((base + i) << 3 | bit for bit in BITS[data[i]])
+
+            position += length
+
+        return
+
+    count = header >> 1
+    blocks, position = readVB(data, position)
+    table = readTable(data[position:position + 12 * blocks])
+    start = position + 12 * blocks
+
+    for i in range(blocks):
+        yield from decodeBlock(data, start + table[2 * blocks + i], table[i], min(BLOCK, count - i * BLOCK))
+
+
+def readTable(data: bytes) -> array:
+    """
+    Reads the skip table of a posting list
+
+    Parameters:
+        data (bytes): The encoded skip table
+
+    Returns:
+        table (array): The first docIDs, last docIDs and byte offsets of the blocks, one after another
+    """
+    table = array("I")
+    table.frombytes(data)
+
+    if sys.byteorder == "big":
+        table.byteswap()
+
+    return table
+
+
+def decodeBlock(data: bytes, start: int, first: int, count: int) -> Iterator[int]:
+    """
+    Decodes the docIDs of a block
+
+    Parameters:
+        data (bytes): The encoded gaps
+        start (int): Byte offset of the gaps of the block
+        first (int): First docID of the block, from the skip table
+        count (int): Number of docIDs in the block
+
+    Returns:
+        docIDs (Iterator): The docIDs of the block in ascending order
+    """
+    return accumulate(decodeVB(data, start, count - 1), initial=first)
+
+
+class Blocks:
+    """
+    Posting list in the postings file whose blocks are only read and
+    decoded when they are needed
+
+    Parameters:
+        handle (BinaryIO): The handle for the postings file
+        start (int): Byte offset of the gaps of the first block
+        end (int): Byte offset of the end of the posting list
+        count (int): Number of docIDs
+        table (array): The skip table of the posting list
+
+    Attributes:
+        handle (BinaryIO): Stores the input handle
+        start (int): Stores the input start
+        end (int): Stores the input end
+        count (int): Stores the input count
+        firsts (array): First docID of each block
+        lasts (array): Last docID of each block
+        offsets (array): Byte offset of the gaps of each block from start
+    """
+
+    def __init__(self, handle: BinaryIO, start: int, end: int, count: int, table: array):
+        blocks = len(table) // 3
+        self.handle = handle
+        self.start = start
+        self.end = end
+        self.count = count
+        self.firsts = table[:blocks]
+        self.lasts = table[blocks:2 * blocks]
+        self.offsets = table[2 * blocks:]
+
+    def __len__(self) -> int:
+        """
+        Gets the number of docIDs
+
+        Parameters:
+            None
+
+        Returns:
+            count (int): Number of docIDs in the posting list
+        """
+        return self.count
+
+    def __sizeof__(self) -> int:
+        """
+        Gets the bytes used in memory, which are mostly the skip table
+
+        Parameters:
+            None
+
+        Returns:
+            size (int): Bytes used by the object and its skip table
+        """
+        return object.__sizeof__(self) + sum(map(sys.getsizeof, (self.firsts, self.lasts, self.offsets)))
+
+    def find(self, docID: int, start: int = 0) -> int:
+        """
+        Finds the block that may contain a docID
+
+        Parameters:
+            docID (int): The docID to be found
+            start (int): Block to search from
+
+        Returns:
+            block (int): The first block whose last docID is not less than docID,
+                         the number of blocks if every docID is smaller
+        """
+        return bisect_left(self.lasts, docID, start)
+
+    def span(self, i: int) -> Tuple[int, int]:
+        """
+        Gets the bytes of a block in the postings file
+
+        Parameters:
+            i (int): The block number
+
+        Returns:
+            start (int): Byte offset of the gaps of the block
+            end (int): Byte offset of the end of the block
+        """
+        end = self.start + self.offsets[i + 1] if i + 1 < len(self.offsets) else self.end
+        return self.start + self.offsets[i], end
+
+    def block(self, i: int) -> array:
+        """
+        Reads and decodes a block
+
+        Parameters:
+            i (int): The block number
+
+        Returns:
+            docIDs (array): The docIDs of the block in ascending order
+        """
+        start, end = self.span(i)
+        self.handle.seek(start)
+        data = self.handle.read(end - start)
+        return array("I", decodeBlock(data, 0, self.firsts[i], min(BLOCK, self.count - i * BLOCK)))
+
+    def decode(self) -> array:
+        """
+        Reads and decodes every block
+
+        Parameters:
+            None
+
+        Returns:
+            docIDs (array): The docIDs in ascending order
+        """
+        docIDs = array("I")
+        self.handle.seek(self.start)
+        data = self.handle.read(self.end - self.start)
+
+        for i, (first, offset) in enumerate(zip(self.firsts, self.offsets)):
+            docIDs.extend(decodeBlock(data, offset, first, min(BLOCK, self.count - i * BLOCK)))
+
+        return docIDs
+
+
+def openPostings(handle: BinaryIO, ptr: int, size: int) -> Union[array, int, Blocks]:
+    """
+    Reads a posting list from the postings file. A list of more than one
+    block is not decoded, only its skip table is read
+
+    Parameters:
+        handle (BinaryIO): The handle for the postings file
+        ptr (int): Byte offset of the posting list
+        size (int): Size of the posting list in bytes
+
+    Returns:
+        docIDs (Union[array, int, Blocks]): The docIDs in ascending order, the bitmap
+                                            of the docIDs or the blocks of the docIDs
+    """
+    handle.seek(ptr)
+    head = handle.read(min(size, HEAD))
+    header, position = readVB(head, 0)
+
+    if header & 1 or header >> 1 <= BLOCK:
+        return decodePostings(head + handle.read(size - len(head)))
+
+    blocks, position = readVB(head, position)
+    handle.seek(ptr + position)
+    table = readTable(handle.read(12 * blocks))
+
+    return Blocks(handle, ptr + position + 12 * blocks, ptr + size, header >> 1, table)
+
+
+def toBitmap(docIDs: list) -> int:
+    """
+    Converts sorted docIDs into a bitmap
+
+    Parameters:
+        docIDs (list): The sorted docIDs
+
+    Returns:
+        bitmap (int): Bitmap with the bit of every docID set
+    """
+    if not docIDs:
+        return 0
+
+    data = bytearray((docIDs[-1] >> 3) + 1)
+
+    for docID in docIDs:
+        data[docID >> 3] |= 1 << (docID & 7)
+
+    return int.from_bytes(data, "little")
+
+
+def fromBitmap(bitmap: int) -> array:
+    """
+    Converts a bitmap into sorted docIDs
+
+    Parameters:
+        bitmap (int): The bitmap
+
+    Returns:
+        docIDs (array): The docIDs whose bits are set, in ascending order
+    """
+    docIDs = array("I")
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) >> 3, "little")
+
+    for i, byte in enumerate(data):
+        if byte:
+            docIDs.extend(i << 3 | bit for bit in BITS[byte])
+
+    return docIDs
@@ -0,0 +1,284 @@
+import io
+import os
+import shutil
+import struct
+import tarfile
+import tempfile
+from typing import Iterator, Tuple
+
+MAGIC = b"CRPS"
+VERSION = 1
+
+# magic, version
+HEADER = struct.Struct("<4sI")
+
+# docID, length of the document in bytes
+ENTRY = struct.Struct("<II")
+
+
+class Corpus:
+    """
+    Documents named by their docIDs, read from a directory with one file
+    per document, from a tar archive or from a packed corpus file written
+    by writeCorpus. The headers of a packed file are scanned once for the
+    offset of each document. A tar archive is decompressed once into a
+    spill file under tempdir, as its members may be in any order and a
+    compressed stream cannot seek, so its documents are then read from the
+    spill file like those of a packed file. Call close to delete the spill file
+
+    Parameters:
+        path (str): path of the directory, the tar archive or the packed corpus file
+        buffersize (int): Size of the read and write buffers in bytes
+        tempdir (str): Directory for the spill file of a tar archive, None for the system default
+
+    Attributes:
+        path (str): Stores the input path
+        buffersize (int): Stores the input buffersize
+        kind (str): "directory", "packed" or "tar"
+        table (dict): (offset, length, mtime) of each docID in the data file, None for a directory
+        data (str): path of the file holding the documents of the table, None for a directory
+    """
+
+    def __init__(self, path: str, buffersize: int = 1 << 20, tempdir: str = None):
+        self.path = path
+        self.buffersize = buffersize
+        self.table = None
+        self.data = None
+
+        if os.path.isdir(path):
+            self.kind = "directory"
+        elif isPacked(path):
+            self.kind = "packed"
+            self.scan()
+        elif tarfile.is_tarfile(path):
+            self.kind = "tar"
+            self.spill(tempdir)
+        else:
+            raise ValueError(path + " is not a directory, a tar archive or a packed corpus file")
+
+    def docIDs(self) -> list:
+        """
+        Gets the docIDs of the documents
+
+        Parameters:
+            None
+
+        Returns:
+            docList (list): The docIDs in ascending order
+        """
+        return [docID for docID, _, _ in self.entries()]
+
+    def entries(self) -> Iterator[Tuple[int, int, int]]:
+        """
+        Streams the docID, size and modification time of each document
+        without reading the documents
+
+        Parameters:
+            None
+
+        Returns:
+            entries (Iterator): (docID, size, mtime) in ascending docID order, mtime
+                                is in nanoseconds and None if the source has none
+        """
+        if self.kind == "directory":
+            for docID in sorted(map(int, os.listdir(self.path))):
+                stat = os.stat(os.path.join(self.path, str(docID)))
+                yield docID, stat.st_size, stat.st_mtime_ns
+
+        else:
+            for docID in sorted(self.table):
+                _, length, mtime = self.table[docID]
+                yield docID, length, mtime
+
+    def documents(self, docList: list = None) -> Iterator[Tuple[int, str]]:
+        """
+        Streams the text of the documents, decoded like a file opened in text mode
+
+        Parameters:
+            docList (list): sorted docIDs of the documents to be read, None to read every document
+
+        Returns:
+            documents (Iterator): (docID, text) in ascending docID order
+        """
+        if self.kind == "directory":
+            for docID in (sorted(map(int, os.listdir(self.path))) if docList is None else docList):
+                with open(os.path.join(self.path, str(docID)), "r") as f:
+                    yield docID, f.read()
+
+        else:
+            docList = sorted(self.table) if docList is None else docList
+
+            # documents in file order that fill most of the bytes they span stream through large buffered
+            # reads, while the scattered documents of an unsorted archive or a sparse subset are each
+            # a single unbuffered read
+            buffering = self.buffersize if self.isSequential(docList) else 0
+
+            with open(self.data, "rb", buffering=buffering) as dataFile:
+                for docID in docList:
+                    offset, length, _ = self.table[docID]
+                    dataFile.seek(offset)
+                    yield docID, decode(dataFile.read(length))
+
+    def isSequential(self, docList: list) -> bool:
+        """
+        Checks if documents are stored in the data file in the same order
+        and hold at least half of the bytes from the first to the end of the last
+
+        Parameters:
+            docList (list): docIDs of the documents to be read
+
+        Returns:
+            sequential (bool): True if the documents are best read with a buffered reader
+        """
+        end = size = 0
+
+        for docID in docList:
+            offset, length, _ = self.table[docID]
+
+            if offset < end:
+                return False
+
+            end = offset + length
+            size += length
+
+        return not docList or size * 2 >= end - self.table[docList[0]][0]
+
+    def scan(self) -> None:
+        """
+        Fills the table from the entry headers of the packed corpus file,
+        seeking past the documents
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+        self.table = {}
+        self.data = self.path
+
+        with open(self.path, "rb", buffering=self.buffersize) as corpusFile:
+            magic, version = HEADER.unpack(corpusFile.read(HEADER.size))
+
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(self.path + " is not a packed corpus file of version " + str(VERSION))
+
+            while (header := corpusFile.read(ENTRY.size)):
+                docID, length = ENTRY.unpack(header)
+                self.add(docID, corpusFile.tell(), length, None)
+                corpusFile.seek(length, os.SEEK_CUR)
+
+    def spill(self, tempdir: str) -> None:
+        """
+        Copies the file members of the tar archive into a spill file in one
+        streamed pass, filling the table with their offsets
+
+        Parameters:
+            tempdir (str): Directory for the spill file, None for the system default
+
+        Returns:
+            None
+        """
+        self.table = {}
+        handle, self.data = tempfile.mkstemp(prefix="corpus-", dir=tempdir)
+
+        try:
+            with os.fdopen(handle, "wb", buffering=self.buffersize) as spillFile:
+                # the stream slices its buffer on every read, so it keeps the default record size
+                with tarfile.open(self.path, "r|*") as archive:
+                    for member in archive:
+                        if member.isfile():
+                            docID = int(os.path.basename(member.name))
+                            self.add(docID, spillFile.tell(), member.size, member.mtime * 10 ** 9)
+                            shutil.copyfileobj(archive.extractfile(member), spillFile, self.buffersize)
+        except BaseException:
+            self.close()
+            raise
+
+    def add(self, docID: int, offset: int, length: int, mtime: int) -> None:
+        """
+        Adds a document to the table
+
+        Parameters:
+            docID (int): The docID of the document
+            offset (int): Position of the document in the data file
+            length (int): Length of the document in bytes
+            mtime (int): Modification time in nanoseconds, None if the source has none
+
+        Returns:
+            None
+        """
+        if docID in self.table:
+            raise ValueError(self.path + " holds more than one document with docID " + str(docID))
+
+        self.table[docID] = (offset, length, mtime)
+
+    def close(self) -> None:
+        """
+        Deletes the spill file of a tar archive
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+        if self.kind == "tar" and self.data is not None:
+            os.remove(self.data)
+            self.data = None
+
+
+def decode(data: bytes) -> str:
+    """
+    Decodes a document the way open() does in text mode
+
+    Parameters:
+        data (bytes): The content of the document
+
+    Returns:
+        text (str): The decoded text with universal newlines
+    """
+    return io.TextIOWrapper(io.BytesIO(data)).read()
+
+
+def isPacked(path: str) -> bool:
+    """
+    Checks if a file is a packed corpus file
+
+    Parameters:
+        path (str): The file path
+
+    Returns:
+        packed (bool): True if the file starts with the magic of a packed corpus file
+    """
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def writeCorpus(in_dir: str, out_file: str, buffersize: int = 1 << 20) -> int:
+    """
+    Packs a directory with one file per document into a packed corpus file.
+    After the header, each document is stored as its docID and length
+    followed by its bytes, in ascending docID order
+
+    Parameters:
+        in_dir (str): folder path of the documents, named by their docIDs
+        out_file (str): file path of the packed corpus file
+        buffersize (int): Size of the write buffer in bytes
+
+    Returns:
+        count (int): Number of documents packed
+    """
+    docList = sorted(map(int, os.listdir(in_dir)))
+
+    with open(out_file, "wb", buffering=buffersize) as corpusFile:
+        corpusFile.write(HEADER.pack(MAGIC, VERSION))
+
+        for docID in docList:
+            with open(os.path.join(in_dir, str(docID)), "rb") as f:
+                data = f.read()
+
+            corpusFile.write(ENTRY.pack(docID, len(data)))
+            corpusFile.write(data)
+
+    return len(docList)
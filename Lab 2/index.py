@@ -5,71 +5,353 @@ import sys
 import getopt
 
 import os
+import pickle
+import hashlib
+from contextlib import nullcontext
+from typing import Iterator, Tuple
+from multiprocessing import Pool
 from postings import Postings
+from analyzer import Analyzer
+from runs import Run
+from corpus import Corpus
 
 
-def build_index(in_dir: str, out_dict: str, out_postings: str) -> None:
+def build_index(in_dir: str, out_dict: str, out_postings: str, tempdir: str = None, fanin: int = 64,
+                memory: int = 500000, workers: int = 1, stemfile: str = None, cachedir: str = None) -> None:
     """
     Builds index from all files in in_dir and splits the index into its
     dictionary and its posting lists
 
     Parameters:
-        in_dir (str): folder path of reuters training files
+        in_dir (str): folder path of reuters training files, or a tar archive or packed corpus file of them
         out_dir (str): file path for dictionary output
         out_postings (str): file path for storing all posting lists
+        tempdir (str): folder path for the intermediate blocks, None for the system default
+        fanin (int): Max number of blocks merged at once
+        memory (int): Max bytes used by the postings of a block (of each worker) before it is written to disk
+        workers (int): Number of processes that tokenize the documents
+        stemfile (str): file path of the stem cache kept across builds, None to not persist it
+        cachedir (str): folder path of the terms of each document kept across builds, None for a full build
 
     Returns:
         None
     """
     print("start indexing")
 
-    post = Postings()
-    docList = sorted(map(int, os.listdir(in_dir)))
+    analyzer = Analyzer(cachefile=stemfile)
+    post = Postings(tempdir, fanin, memory, analyzer)
+    corpus = Corpus(in_dir, tempdir=post.tempdir)
 
-    for docID in docList:
-        file = os.path.join(in_dir, str(docID))
+    try:
+        if cachedir is not None:
+            add_changed_documents(post, corpus, cachedir, workers, stemfile)
 
-        with open(file, "r") as f:
-            for sentence in nltk.sent_tokenize(f.read()):
-                tokenList = nltk.word_tokenize(sentence)
-                tokenList.append("!!all!!")  # To ensure that docID is added to the 'all' list
-                post.addToPostings(tokenList, docID)
+        elif workers > 1:
+            # contiguous docID ranges keep the blocks of all workers in docID order
+            docList = corpus.docIDs()
+            count = workers * 4
+            size = max(-(-len(docList) // count), 1)
+            tasks = [(docList[i:i + size], post.tempdir, memory, stemfile) for i in range(0, len(docList), size)]
 
-    # write last remaining block not saved to disk
-    post.writeBlockToDisk()
+            with Pool(workers, initializer=attach_corpus, initargs=(corpus,)) as pool:
+                for paths, peaks, stems in pool.imap(index_documents, tasks):
+                    post.runs.extend(Run(path) for path in paths)
+                    post.peaks.extend(peaks)
+                    analyzer.update(stems)
+
+        else:
+            for docID, text in corpus.documents():
+                add_document(post, docID, text)
+
+            # write last remaining block not saved to disk
+            post.writeBlockToDisk()
+    finally:
+        corpus.close()
 
     # merge blocks and save to dictionary and postings to relevant output files
     with open(out_dict, "wb") as out_dict:
         with open(out_postings, "wb") as out_postings:
             post.mergeBlocks(out_dict, out_postings)
 
+    analyzer.save()
     print("indexing completed")
 
 
+def add_document(post: Postings, docID: int, text: str) -> None:
+    """
+    Tokenizes a document and adds its terms to the postings
+
+    Parameters:
+        post (Postings): The postings being built
+        docID (int): docID of the document
+        text (str): The text of the document
+
+    Returns:
+        None
+    """
+    post.addTerms(analyze_document(post.analyzer, text), docID)
+
+
+def analyze_document(analyzer: Analyzer, text: str) -> list:
+    """
+    Tokenizes a document and gets its terms
+
+    Parameters:
+        analyzer (Analyzer): Turns the tokens into terms
+        text (str): The text of the document
+
+    Returns:
+        terms (list): The distinct terms of the document in ascending order
+    """
+    terms = set()
+
+    for sentence in nltk.sent_tokenize(text):
+        tokenList = nltk.word_tokenize(sentence)
+        tokenList.append("!!all!!")  # To ensure that docID is added to the 'all' list
+        terms.update(analyzer.analyze(tokenList))
+
+    return sorted(terms)
+
+
+def add_changed_documents(post: Postings, corpus: Corpus, cachedir: str, workers: int, stemfile: str) -> None:
+    """
+    Adds the documents to the postings, tokenizing only the documents that
+    are new or changed since the last build and reusing the cached terms of
+    the others. A document is unchanged if its size and mtime are the same,
+    or else if its content hash is the same. Documents of a packed corpus
+    file have no mtime, so their hashes are always compared. The cache
+    folder holds the manifest of the documents and the terms of each
+    document, which are rewritten for the documents of the corpus. The
+    manifest records the version of the analyzer, and every document is
+    tokenized again if it differs from the version of post.analyzer. Both
+    files are written aside and then replaced, and the terms file starts
+    with a generation id kept in the manifest, so a build that stopped
+    between the two replacements is detected and every document tokenized again
+
+    Parameters:
+        post (Postings): The postings being built
+        corpus (Corpus): The documents to be indexed
+        cachedir (str): folder path of the manifest and the terms of the documents
+        workers (int): Number of processes that tokenize the changed documents
+        stemfile (str): file path of the stem cache kept across builds, None to not persist it
+
+    Returns:
+        None
+    """
+    os.makedirs(cachedir, exist_ok=True)
+    manifestFile = os.path.join(cachedir, "manifest")
+    termsFile = os.path.join(cachedir, "terms")
+    generation = os.urandom(16)
+    manifest = {}
+
+    if os.path.exists(manifestFile) and os.path.exists(termsFile):
+        with open(manifestFile, "rb") as f:
+            cache = pickle.load(f)
+
+        with open(termsFile, "rb") as f:
+            stamp = f.read(len(generation))
+
+        # terms made by another analyzer may differ, so none of them are reused
+        if not isinstance(cache, dict) or cache.get("version") != post.analyzer.version:
+            print("analyzer changed, tokenizing every document")
+        elif cache.get("generation") != stamp:
+            print("manifest does not match the terms, tokenizing every document")
+        else:
+            manifest = cache["documents"]
+
+    entries = {}
+    unsure = []
+    changed = []
+
+    for docID, size, mtime in corpus.entries():
+        entry = manifest.get(docID)
+
+        if entry is not None and mtime is not None and (entry["size"], entry["mtime"]) == (size, mtime):
+            entries[docID] = entry
+        else:
+            entries[docID] = {"size": size, "mtime": mtime}
+            unsure.append(docID)
+
+    for docID, text in corpus.documents(unsure):
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        entry = manifest.get(docID)
+
+        if entry is not None and entry["hash"] == digest:
+            entries[docID] = dict(entry, **entries[docID])
+        else:
+            entries[docID]["hash"] = digest
+            changed.append(docID)
+
+    docList = list(entries)
+
+    print("tokenizing", len(changed), "of", len(docList), "documents")
+
+    pool = Pool(workers, initializer=attach_corpus, initargs=(corpus,)) if workers > 1 and changed else None
+
+    # the pool, if any, is terminated once the terms are written or if indexing raises
+    with pool or nullcontext():
+        if pool is not None:
+            size = -(-len(changed) // (workers * 4))
+            tasks = [(changed[i:i + size], stemfile) for i in range(0, len(changed), size)]
+            analyzed = merge_analyzed(post.analyzer, pool.imap(analyze_documents, tasks))
+        else:
+            analyzed = ((docID, analyze_document(post.analyzer, text)) for docID, text in corpus.documents(changed))
+
+        # the old terms are read in docID order, and the new terms written in the same order
+        old = open(termsFile, "rb") if manifest else None
+
+        with open(termsFile + ".new", "wb") as new:
+            new.write(generation)
+
+            for docID in docList:
+                entry = entries[docID]
+
+                if "offset" in entry:
+                    old.seek(entry["offset"])
+                    data = old.read(entry["length"])
+                    terms = data.decode("utf-8").split("\n") if data else []
+                else:
+                    _, terms = next(analyzed)
+                    data = "\n".join(terms).encode("utf-8")
+
+                entries[docID] = dict(entry, offset=new.tell(), length=len(data))
+                new.write(data)
+                post.addTerms(terms, docID)
+
+        if old is not None:
+            old.close()
+
+    with open(manifestFile + ".new", "wb") as f:
+        pickle.dump({"version": post.analyzer.version, "generation": generation, "documents": entries}, f)
+
+    os.replace(termsFile + ".new", termsFile)
+    os.replace(manifestFile + ".new", manifestFile)
+
+    # write last remaining block not saved to disk
+    post.writeBlockToDisk()
+
+
+# the corpus being indexed, set up by attach_corpus in each worker process
+workerCorpus = None
+
+
+def attach_corpus(corpus: Corpus) -> None:
+    """
+    Keeps the corpus in a worker process, so that its table is sent once
+    rather than with every task
+
+    Parameters:
+        corpus (Corpus): The corpus being indexed, whose documents are read by the worker
+
+    Returns:
+        None
+    """
+    global workerCorpus
+    workerCorpus = corpus
+
+
+def analyze_documents(task: tuple) -> Tuple[list, dict]:
+    """
+    Tokenizes documents in a worker process
+
+    Parameters:
+        task (tuple): (docList, stemfile) where docList is a sorted list of docIDs
+
+    Returns:
+        analyzed (list): (docID, terms) of each document in docID order
+        stems (dict): The stems memoized by the worker if they are persisted, otherwise empty
+    """
+    docList, stemfile = task
+    analyzer = Analyzer(cachefile=stemfile)
+    analyzed = [(docID, analyze_document(analyzer, text)) for docID, text in workerCorpus.documents(docList)]
+    return analyzed, analyzer.stems if stemfile is not None else {}
+
+
+def merge_analyzed(analyzer: Analyzer, results: Iterator[Tuple[list, dict]]) -> Iterator[Tuple[int, list]]:
+    """
+    Streams the documents tokenized by the workers in docID order, keeping the stems they memoized
+
+    Parameters:
+        analyzer (Analyzer): The analyzer of the build, which keeps the stems
+        results (Iterator): The results of analyze_documents in docID order
+
+    Returns:
+        analyzed (Iterator): (docID, terms) of each document
+    """
+    for analyzed, stems in results:
+        analyzer.update(stems)
+        yield from analyzed
+
+
+def index_documents(task: tuple) -> Tuple[list, list, dict]:
+    """
+    Builds the sorted blocks of a range of documents in a worker process
+
+    Parameters:
+        task (tuple): (docList, tempdir, memory, stemfile) where docList is a sorted range
+                      of docIDs and the blocks are written under tempdir
+
+    Returns:
+        paths (list): file paths of the blocks written, in docID order
+        peaks (list): Bytes used by the postings of each block when it was written
+        stems (dict): The stems memoized by the worker if they are persisted, otherwise empty
+    """
+    docList, tempdir, memory, stemfile = task
+    analyzer = Analyzer(cachefile=stemfile)
+    post = Postings(tempdir, blocksize=memory, analyzer=analyzer)
+
+    for docID, text in workerCorpus.documents(docList):
+        add_document(post, docID, text)
+
+    post.writeBlockToDisk()
+    return [run.path for run in post.runs], post.peaks, analyzer.stems if stemfile is not None else {}
+
+
 def usage():
-    print("usage: " + sys.argv[0] + " -i directory-of-documents -d dictionary-file -p postings-file")
+    print("usage: " + sys.argv[0] + " -i directory-or-archive-of-documents -d dictionary-file -p postings-file"
+          + " [-t temp-directory] [-f merge-fan-in] [-m block-memory-bytes] [-j workers]"
+          + " [-s stem-cache-file] [-c incremental-cache-directory]")
 
 
-input_directory = output_file_dictionary = output_file_postings = None
+if __name__ == '__main__':
+    input_directory = output_file_dictionary = output_file_postings = temp_directory = None
+    fan_in = 64
+    block_memory = 500000
+    workers = 1
+    stem_file = None
+    cache_directory = None
 
-try:
-    opts, args = getopt.getopt(sys.argv[1:], 'i:d:p:')
-except getopt.GetoptError:
-    usage()
-    sys.exit(2)
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'i:d:p:t:f:m:j:s:c:')
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
 
-for o, a in opts:
-    if o == '-i':  # input directory
-        input_directory = a
-    elif o == '-d':  # dictionary file
-        output_file_dictionary = a
-    elif o == '-p':  # postings file
-        output_file_postings = a
-    else:
-        assert False, "unhandled option"
+    for o, a in opts:
+        if o == '-i':  # input directory
+            input_directory = a
+        elif o == '-d':  # dictionary file
+            output_file_dictionary = a
+        elif o == '-p':  # postings file
+            output_file_postings = a
+        elif o == '-t':  # directory for intermediate blocks
+            temp_directory = a
+        elif o == '-f':  # max blocks merged at once
+            fan_in = int(a)
+        elif o == '-m':  # memory budget of a block in bytes
+            block_memory = int(a)
+        elif o == '-j':  # number of indexing processes
+            workers = int(a)
+        elif o == '-s':  # stem cache file
+            stem_file = a
+        elif o == '-c':  # cache of the terms of each document for incremental builds
+            cache_directory = a
+        else:
+            assert False, "unhandled option"
 
-if input_directory is None or output_file_postings is None or output_file_dictionary is None:
-    usage()
-    sys.exit(2)
+    if input_directory is None or output_file_postings is None or output_file_dictionary is None:
+        usage()
+        sys.exit(2)
 
-build_index(input_directory, output_file_dictionary, output_file_postings)
+    build_index(input_directory, output_file_dictionary, output_file_postings, temp_directory, fan_in, block_memory, workers,
+                stem_file, cache_directory)
@@ -0,0 +1,214 @@
+import sys
+import mmap
+import struct
+from array import array
+from typing import BinaryIO
+from codec import encodeVB, readVB
+
+MAGIC = b"BLEX"
+VERSION = 1
+
+# magic, version, number of terms, first and last docID of the collection
+HEADER = struct.Struct("<4sIIII")
+
+# terms per front-coded block, only the first term of a block is stored in full
+INTERVAL = 16
+
+
+def writeLexicon(dictionary: dict, out_dict: BinaryIO, end: int) -> None:
+    """
+    Writes the dictionary built by Postings.mergeBlocks as a lexicon file.
+    After the header come the document frequencies as unsigned 32 bit
+    integers, the postings offsets as unsigned 64 bit integers with the end
+    of the postings file appended, the offset of each block of terms and
+    then the blocks of sorted terms. The first term of a block is stored as
+    its length and bytes, and every other term as the length of the prefix
+    it shares with the term before it, the length of the rest and the rest
+
+    Parameters:
+        dictionary (dict): Terms and their count and ptr, in ascending order as their postings were written
+        out_dict (BinaryIO): File handle for the dictionary file
+        end (int): Size of the postings file
+
+    Returns:
+        None
+    """
+    terms = list(dictionary)
+    everything = dictionary.get("!!all!!", {})
+    counts = array("I", (dictionary[term]["count"] for term in terms))
+    ptrs = array("Q", [dictionary[term]["ptr"] for term in terms] + [end])
+    blocks = bytearray()
+    offsets = array("I")
+    previous = b""
+
+    for i, term in enumerate(terms):
+        encoded = term.encode("utf-8")
+
+        if i % INTERVAL == 0:
+            offsets.append(len(blocks))
+            blocks.extend(encodeVB([len(encoded)]))
+            blocks.extend(encoded)
+        else:
+            shared = 0
+            limit = min(len(previous), len(encoded))
+
+            while shared < limit and previous[shared] == encoded[shared]:
+                shared += 1
+
+            blocks.extend(encodeVB([shared, len(encoded) - shared]))
+            blocks.extend(encoded[shared:])
+
+        previous = encoded
+
+    out_dict.write(HEADER.pack(MAGIC, VERSION, len(terms), everything.get("first", 0), everything.get("last", 0)))
+
+    for numbers in (counts, ptrs, offsets):
+        if sys.byteorder == "big":
+            numbers.byteswap()  # the file is little endian
+
+        out_dict.write(numbers.tobytes())
+
+    out_dict.write(blocks)
+
+
+class Lexicon:
+    """
+    Read-only view of a lexicon file written by writeLexicon. The file is
+    memory mapped and terms are found by binary search over the first terms
+    of the blocks, so opening it costs the same for any vocabulary size.
+    Entries are dicts with the same keys as the ones built by Postings
+
+    Parameters:
+        path (str): file path of the dictionary file
+
+    Attributes:
+        data (mmap): The memory mapped file
+        size (int): Number of terms
+        first (int): First docID of the collection
+        last (int): Last docID of the collection
+        counts (int): Byte offset of the document frequencies
+        ptrs (int): Byte offset of the postings offsets
+        offsets (int): Byte offset of the block offsets
+        blocks (int): Byte offset of the blocks of terms
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as lexiconFile:
+            self.data = mmap.mmap(lexiconFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.size, self.first, self.last = HEADER.unpack_from(self.data)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + " is not a lexicon file of version " + str(VERSION))
+
+        self.counts = HEADER.size
+        self.ptrs = self.counts + 4 * self.size
+        self.offsets = self.ptrs + 8 * (self.size + 1)
+        self.blocks = self.offsets + 4 * (-(-self.size // INTERVAL))
+
+    def __len__(self) -> int:
+        """
+        Gets the number of terms
+
+        Parameters:
+            None
+
+        Returns:
+            size (int): Number of terms in the lexicon
+        """
+        return self.size
+
+    def __contains__(self, term: str) -> bool:
+        """
+        Checks if a term is in the lexicon
+
+        Parameters:
+            term (str): The search term
+
+        Returns:
+            found (bool): True if term is found
+        """
+        return self.find(term) >= 0
+
+    def __getitem__(self, term: str) -> dict:
+        """
+        Gets the entry of a term
+
+        Parameters:
+            term (str): The search term
+
+        Returns:
+            entry (dict): The count, ptr and size of the postings of the term
+        """
+        i = self.find(term)
+
+        if i < 0:
+            raise KeyError(term)
+
+        # postings are written in term order, so each list ends where the next one starts
+        ptr, end = struct.unpack_from("<QQ", self.data, self.ptrs + 8 * i)
+        count, = struct.unpack_from("<I", self.data, self.counts + 4 * i)
+        entry = {"count": count, "ptr": ptr, "size": end - ptr}
+
+        if term == "!!all!!":
+            entry["first"] = self.first
+            entry["last"] = self.last
+
+        return entry
+
+    def find(self, term: str) -> int:
+        """
+        Finds the position of a term
+
+        Parameters:
+            term (str): The search term
+
+        Returns:
+            position (int): Position of the term in sorted order, -1 if term is not found
+        """
+        if self.size == 0:
+            return -1
+
+        encoded = term.encode("utf-8")
+        low = 0
+        high = -(-self.size // INTERVAL)
+
+        # finds the last block whose first term is not greater than the term
+        while high - low > 1:
+            middle = (low + high) // 2
+
+            if self.head(middle) <= encoded:
+                low = middle
+            else:
+                high = middle
+
+        position = self.blocks + struct.unpack_from("<I", self.data, self.offsets + 4 * low)[0]
+        length, position = readVB(self.data, position)
+        current = self.data[position:position + length]
+        position += length
+
+        for i in range(low * INTERVAL, min((low + 1) * INTERVAL, self.size)):
+            if i > low * INTERVAL:
+                shared, position = readVB(self.data, position)
+                length, position = readVB(self.data, position)
+                current = current[:shared] + self.data[position:position + length]
+                position += length
+
+            if current >= encoded:
+                return i if current == encoded else -1
+
+        return -1
+
+    def head(self, block: int) -> bytes:
+        """
+        Gets the first term of a block
+
+        Parameters:
+            block (int): The block number
+
+        Returns:
+            term (bytes): The utf-8 encoded first term of the block
+        """
+        position = self.blocks + struct.unpack_from("<I", self.data, self.offsets + 4 * block)[0]
+        length, position = readVB(self.data, position)
+        return self.data[position:position + length]
@@ -0,0 +1,32 @@
+#!/usr/bin/python3
+import sys
+import getopt
+
+from corpus import writeCorpus
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -i directory-of-documents -o packed-corpus-file")
+
+
+input_directory = output_file = None
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 'i:o:')
+except getopt.GetoptError:
+    usage()
+    sys.exit(2)
+
+for o, a in opts:
+    if o == '-i':  # input directory
+        input_directory = a
+    elif o == '-o':  # packed corpus file
+        output_file = a
+    else:
+        assert False, "unhandled option"
+
+if input_directory is None or output_file is None:
+    usage()
+    sys.exit(2)
+
+print("packed", writeCorpus(input_directory, output_file), "documents into", output_file)
@@ -1,4 +1,4 @@
-from nltk.stem import PorterStemmer
+from analyzer import Analyzer
 
 
 class Parser:
@@ -6,13 +6,16 @@ class Parser:
     Converts string query into reverse polish notation
     using shunting yard algorithm
 
+    Parameters:
+        analyzer (Analyzer): Turns tokens into terms like the index does, None for a new one
+
     Attributes:
-        porter (PorterStemmer): Used for stemming tokens in queries
+        analyzer (Analyzer): Used for stemming tokens in queries
         operators (dict): Store operator precedence
     """
 
-    def __init__(self):
-        self.porter = PorterStemmer()
+    def __init__(self, analyzer: Analyzer = None):
+        self.analyzer = analyzer if analyzer is not None else Analyzer()
         self.operators = {"(": -1, ")": -1, "NOT": 3, "AND": 2, "OR": 1}
 
     def parse(self, query: str) -> list:
@@ -63,7 +66,7 @@ class Parser:
 
             if token not in self.operators:
                 # also performs stemming and case-folding of non-operators
-                queue.append(self.porter.stem(token.lower()))
+                queue.append(self.analyzer.stem(token))
 
             else:
                 if token == "(":
@@ -0,0 +1,192 @@
+from typing import Union
+
+# a plan is either a term or an (operator, operands) pair
+Plan = Union[str, tuple]
+
+
+def canonical(plan: Plan) -> Plan:
+    """
+    Gets the canonical form of a plan, in which the operands of AND and OR
+    and the subtracted operands of DIFF are sorted, so that plans giving
+    the same result for the same reason are equal
+
+    Parameters:
+        plan (Plan): The plan
+
+    Returns:
+        canonical (Plan): The plan as nested tuples that can be used as a key
+    """
+
+    if isinstance(plan, str):
+        return plan
+
+    operator, operands = plan
+    operands = [canonical(operand) for operand in operands]
+
+    if operator == "DIFF":
+        return (operator, operands[0]) + tuple(sorted(operands[1:], key=repr))
+
+    return (operator,) + tuple(sorted(operands, key=repr))
+
+
+class Planner:
+    """
+    Turns a query in reverse polish notation into a plan for the Runner
+
+    Nested AND and OR chains are flattened into n-ary operators, the operands
+    of AND are ordered by ascending document frequency and the NOT operands of
+    an AND are subtracted from the result of the others with DIFF
+
+    Parameters:
+        dictionary (dict): Contains terms and their document frequencies
+
+    Attributes:
+        terms (dict): Stores input dictionary
+        total (int): Number of documents in the collection
+    """
+
+    def __init__(self, dictionary: dict):
+        self.terms = dictionary
+        self.total = self.frequency("!!all!!")
+
+    def plan(self, query: list) -> Plan:
+        """
+        Builds the plan of a query
+
+        Parameters:
+            query (list): the query in reverse polish notation
+
+        Returns:
+            plan (Plan): The plan to be executed by the Runner
+        """
+
+        stack = list()
+
+        for token in query:
+            if token == "AND" or token == "OR":
+                t2, t1 = stack.pop(), stack.pop()
+                stack.append((token, self.flatten(token, t1) + self.flatten(token, t2)))
+
+            elif token == "NOT":
+                stack.append(("NOT", [stack.pop()]))
+
+            else:
+                stack.append(token)
+
+        return self.rewrite(stack.pop())
+
+    def flatten(self, operator: str, plan: Plan) -> list:
+        """
+        Gets the operands of a plan that are joined by the given operator
+
+        Parameters:
+            operator (str): AND or OR
+            plan (Plan): The plan to be flattened
+
+        Returns:
+            operands (list): The operands of the plan if it has the same operator,
+                             otherwise the plan itself
+        """
+
+        if isinstance(plan, tuple) and plan[0] == operator:
+            return plan[1]
+
+        return [plan]
+
+    def rewrite(self, plan: Plan) -> Plan:
+        """
+        Orders the operands of the plan by their cost and rewrites AND NOT
+        into DIFF, so the rarest lists are read first and the Runner can
+        stop as soon as the result is empty
+
+        Parameters:
+            plan (Plan): The flattened plan
+
+        Returns:
+            plan (Plan): The rewritten plan
+        """
+
+        if isinstance(plan, str):
+            return plan
+
+        operator, operands = plan
+        operands = [self.rewrite(operand) for operand in operands]
+
+        if operator == "NOT":
+            # NOT NOT x is x
+            return operands[0][1][0] if self.isNot(operands[0]) else (operator, operands)
+
+        if operator == "OR":
+            # unions of the shorter lists first keep the intermediate lists short
+            return (operator, sorted(operands, key=self.cost))
+
+        positive = sorted((operand for operand in operands if not self.isNot(operand)), key=self.cost)
+        negative = sorted((operand[1][0] for operand in operands if self.isNot(operand)), key=self.cost)
+
+        if not positive:
+            # at least one complement has to be computed when every operand is negated
+            positive = [("NOT", [negative.pop(0)])]
+
+        base = positive[0] if len(positive) == 1 else ("AND", positive)
+
+        if not negative:
+            return base
+
+        return ("DIFF", [base] + negative)
+
+    def cost(self, plan: Plan) -> int:
+        """
+        Estimates the number of docIDs in the result of a plan
+
+        Parameters:
+            plan (Plan): The plan to be estimated
+
+        Returns:
+            cost (int): Upper bound of the number of docIDs in the result
+        """
+
+        if isinstance(plan, str):
+            return self.frequency(plan)
+
+        operator, operands = plan
+
+        if operator == "AND":
+            return min(map(self.cost, operands))
+
+        if operator == "OR":
+            return min(sum(map(self.cost, operands)), self.total)
+
+        if operator == "NOT":
+            return max(self.total - self.cost(operands[0]), 0)
+
+        # DIFF is bounded by the list the others are subtracted from
+        return self.cost(operands[0])
+
+    def frequency(self, term: str) -> int:
+        """
+        Gets the document frequency of a term
+
+        Parameters:
+            term (str): The search term
+
+        Returns:
+            count (int): Number of documents containing the term, 0 if term is not found
+        """
+
+        if term not in self.terms:
+            return 0
+
+        return self.terms[term]["count"]
+
+    def isNot(self, plan: Plan) -> bool:
+        """
+        Checks if the plan is a NOT
+
+        Parameters:
+            plan (Plan): The plan to be checked
+
+        Returns:
+            isNot (bool): True if the plan is a NOT
+        """
+
+        return isinstance(plan, tuple) and plan[0] == "NOT"
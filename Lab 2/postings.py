@@ -1,29 +1,49 @@
 import os
-import math
+import sys
 import heapq
-import pickle
-import string
-from typing import BinaryIO
-from collections import OrderedDict
-from nltk.stem import PorterStemmer
+import shutil
+import tempfile
+from array import array
+from itertools import groupby
+from typing import BinaryIO, Iterable, Iterator, Tuple
+from runs import Run
+from analyzer import Analyzer
+from codec import encodePostings, encodeBitmap, DENSITY
+from lexicon import writeLexicon
 
 
 class Postings:
     """
     Creates posting list and stores them in index and postings files
 
+    Parameters:
+        tempdir (str): Directory for the intermediate run files, None for the system default
+        fanin (int): Max number of runs merged at once
+        blocksize (int): Memory budget in bytes for the in-memory postings
+        analyzer (Analyzer): Turns tokens into terms, None for one without a cache file
+
     Attributes:
-        pickleno (int): filename for the intermediate storage pickle file
+        blockno (int): Number of blocks written so far, also used as the next run's filename
         postings (dict): In-memory storage of postings list
         blocksize (int): Max size that the postings reach
-        porter (PorterStemmer): Used to perform stemming on tokens
+        used (int): Bytes used by the terms and posting lists in postings, excluding the dict itself
+        peaks (list): Bytes used by the postings of each block when it was written
+        analyzer (Analyzer): Used to filter and stem tokens
+        tempdir (str): Directory holding the run files of this index build
+        fanin (int): Stores the input fanin
+        runs (list): Runs written so far, in docID order
     """
 
-    def __init__(self):
-        self.pickleno = 0
+    def __init__(self, tempdir: str = None, fanin: int = 64, blocksize: int = 500000, analyzer: Analyzer = None):
+        self.blockno = 0
         self.postings = {}
-        self.blocksize = 500000  # in bytes (0.5 mb); should produce like 7 files
-        self.porter = PorterStemmer()
+        self.blocksize = blocksize  # in bytes, counting the dict, its terms and their posting lists
+        self.used = 0
+        self.peaks = []
+        self.analyzer = analyzer if analyzer is not None else Analyzer()
+        self.tempdir = tempfile.mkdtemp(prefix="blocks-", dir=tempdir)
+        self.fanin = max(fanin, 2)
+        self.runs = []
 
     def addToPostings(self, tokenList: list, docID: int) -> None:
         """
@@ -37,27 +57,52 @@ class Postings:
         Returns:
             None
         """
-        bannedTokens = ["``", "--", "''"]
+        # filters tokens which do not have any value
+        self.addTerms(self.analyzer.analyze(tokenList), docID)
+
+    def addTerms(self, terms: Iterable[str], docID: int) -> None:
+        """
+        Adds each analyzed term of a document to the dictionary
+
+        Parameters:
+            terms (Iterable): Terms of the document, already filtered and stemmed
+            docID (int): docID of the file associated with the terms
+
+        Returns:
+            None
+        """
+        for term in terms:
+            docIDs = self.postings.get(term)
+
+            if docIDs is None:
+                docIDs = self.postings[term] = array("I")
+                self.used += sys.getsizeof(term) + sys.getsizeof(docIDs)
 
-        for token in tokenList:
-            # filters tokens which do not have any value
-            if not (token in string.punctuation or token in bannedTokens or ".." in token):
+            # documents are added in ascending docID order so a repeat can only be the last docID
+            if not docIDs or docIDs[-1] != docID:
+                before = sys.getsizeof(docIDs)
+                docIDs.append(docID)
+                self.used += sys.getsizeof(docIDs) - before
 
-                term = self.porter.stem(token.lower())
+            # store dictionary into intermediate storage if size exceeds allocated memory size
+            if self.memoryUsed() > self.blocksize:
+                self.writeBlockToDisk()
 
-                if term not in self.postings:
-                    self.postings[term] = list()
+    def memoryUsed(self) -> int:
+        """
+        Gets the bytes used by the in-memory postings
 
-                if docID not in self.postings[term]:
-                    self.postings[term].append(docID)
+        Parameters:
+            None
 
-                # store dictionary into intermediate storage if size exceeds allocated memory size
-                if self.postings.__sizeof__() > self.blocksize:
-                    self.writeBlockToDisk()
+        Returns:
+            size (int): Size of the dict, its terms and their posting lists in bytes
+        """
+        return sys.getsizeof(self.postings) + self.used
 
     def writeBlockToDisk(self) -> None:
         """
-        Writes intermediate dictionary to disk
+        Writes intermediate dictionary to disk as a sorted run
 
         Parameters:
             None
@@ -65,24 +110,38 @@ class Postings:
         Returns:
             None
         """
-        print("creating block no:", self.pickleno)
-        sortedTerms = OrderedDict(sorted(self.postings.items()))
+        self.peaks.append(self.memoryUsed())
+        print("creating block no:", self.blockno, "(" + str(self.peaks[-1]) + " bytes in memory)")
 
-        with open(str(self.pickleno) + ".pickle", "wb") as pickleFile:
-            # saves each term, posting as a separate pickle
-            # save pickle file number for comparison on heap later
-            for term, posting in sortedTerms.items():
-                toSave = [term, self.pickleno, posting]
-                pickle.dump(toSave, pickleFile)
-
-        self.pickleno += 1
+        run = self.newRun()
+        run.write((term, self.postings[term]) for term in sorted(self.postings))
+        self.runs.append(run)
         self.postings = {}  # Resets dictionary
+        self.used = 0
+
+    def newRun(self) -> Run:
+        """
+        Creates a run with an unused filename in the temp directory
+
+        Parameters:
+            None
+
+        Returns:
+            run (Run): The new run
+        """
+        run = Run(os.path.join(self.tempdir, str(self.blockno) + ".run"))
+        self.blockno += 1
+        return run
 
     def mergeBlocks(self, out_dict: BinaryIO, out_postings: BinaryIO) -> None:
         """
         Merge blocks in n-way merge and stores terms with docCount and pointer
         in dictionary file and postings in postings file
 
+        Runs are merged at most fanin at a time. Groups of consecutive runs
+        are merged into intermediate runs until fanin runs are left, and
+        the last pass writes the dictionary and postings
+
         Parameters:
             out_dict (BinaryIO): File handle for the dictionary file
             out_postings (BinaryIO): File handle for the postings file
@@ -90,86 +149,91 @@ class Postings:
         Returns:
             None
         """
-        print("merging blocks")
+        print("merging blocks (largest block: " + str(max(self.peaks, default=0)) + " bytes in memory)")
 
-        heap = []
         dictionary = {}
+        runs = self.runs
+
+        while len(runs) > self.fanin:
+            merged = []
+
+            # merges consecutive runs so that every run still covers a docID range after the one before it
+            for i in range(0, len(runs), self.fanin):
+                group = runs[i:i + self.fanin]
+
+                if len(group) > 1:
+                    run = self.newRun()
+                    run.write(self.mergeRuns(group))
+                    for old in group:
+                        old.remove()
+                    group = [run]
+
+                merged.extend(group)
+
+            runs = merged
 
-        # initialise intermediate dictionary pickle file handles
-        handles = [open(str(i) + ".pickle", "rb") for i in range(self.pickleno)]
+        for term, docIDs in self.mergeRuns(runs):
+            # stores term and posting once all postings for that term are found
+            self.processEntry(term, docIDs.tolist(), out_postings, dictionary)
 
-        # initialise heap
-        for entry in handles:
-            heapq.heappush(heap, pickle.load(entry))
+        writeLexicon(dictionary, out_dict, out_postings.tell())
 
-        # used to check if all postings for a term is combined
-        currentToken = heapq.heappop(heap)
+        # delete intermediate files
+        self.runs = []
+        shutil.rmtree(self.tempdir, ignore_errors=True)
 
-        # always ensure that there are i elements in the heap
-        # so that the smallest token will be compared with all intermediate files
-        heapq.heappush(heap, pickle.load(handles[currentToken[1]]))
+    def mergeRuns(self, runs: list) -> Iterator[Tuple[str, array]]:
+        """
+        Streams the entries of several runs merged by term. As each run
+        holds later documents than the runs before it, the posting lists of a
+        term are concatenated in run order without comparing docIDs
 
-        while heap:
+        Parameters:
+            runs (list): The runs to be merged, in docID order
 
-            # gets smallest token also taking into account file order
-            entry = heapq.heappop(heap)
+        Returns:
+            entries (Iterator): (term, docIDs) pairs in ascending term order
+        """
+        # the run index breaks ties between equal terms so that posting lists are never compared
+        streams = [((term, i, docIDs) for term, docIDs in run.entries()) for i, run in enumerate(runs)]
 
-            if entry[0] != currentToken[0]:
-                # stores term and posting if all postings for that term is found
-                self.processEntry(currentToken, out_postings, dictionary)
-                currentToken = entry
-            else:
-                for docID in entry[2]:
-                    if docID not in currentToken[2]:
-                        currentToken[2].append(docID)
+        for term, group in groupby(heapq.merge(*streams), key=lambda entry: entry[0]):
+            merged = array("I")
 
-            try:
-                heapq.heappush(heap, pickle.load(handles[entry[1]]))
-            except EOFError:
-                # delete intermediate file if no more tokens can be read
-                handles[entry[1]].close()
-                os.remove(str(entry[1]) + ".pickle")
+            for _, _, docIDs in group:
+                # a document split across two blocks appears at the end of one and the start of the next
+                skip = 1 if merged and docIDs and docIDs[0] == merged[-1] else 0
+                merged.extend(docIDs[skip:])
 
-        # process the last token
-        self.processEntry(currentToken, out_postings, dictionary)
-        pickle.dump(dictionary, out_dict)
+            yield term, merged
 
-    def processEntry(self, entry: list, out_postings: BinaryIO, dictionary: dict) -> None:
+    def processEntry(self, term: str, postings: list, out_postings: BinaryIO, dictionary: dict) -> None:
         """
         Process a completed entry from the merged blocks and stores its
         postings into the postings file
 
         Parameters:
-            entry (list): [term, pickle_file_number, posting_list]
+            term (str): The term of the entry
+            postings (list): The sorted docIDs of the term
             out_postings (BinaryIO): File handle for the postings file
             dictionary (dict): Dictionary to store information about the entry itself
 
         Returns:
             None
         """
-        docCount = len(entry[2])
+        docCount = len(postings)
         startPointer = out_postings.tell()  # get position of postings file current pointer
-        dictionary[entry[0]] = {"count": docCount, "ptr": startPointer}
-        postingList = self.addSkipPointers(entry[2])
-        pickle.dump(postingList, out_postings)
-
-    def addSkipPointers(self, postings: list) -> list:
-        """
-        Adds skip pointers to the list
-
-        Parameters:
-            postings (list): the posting list
 
-        Returns:
-            postings (list): the posting list with skip pointers added
-        """
-        ptr = 0
-        skip = int(math.sqrt(len(postings)))
+        # dense lists are smaller and faster to combine as bitmaps
+        if postings and docCount * DENSITY > postings[-1]:
+            encoded = encodeBitmap(postings)
+        else:
+            encoded = encodePostings(postings)
 
-        while ptr < len(postings) - skip:
-            postings[ptr] = str(postings[ptr]) + "|" + str(skip + ptr)
-            ptr += skip
+        dictionary[term] = {"count": docCount, "ptr": startPointer, "size": len(encoded)}
+        out_postings.write(encoded)
 
-        # marks the last skip pointer as -1 to prevent further skips
-        postings[ptr] = str(postings[ptr]) + "|" + str(-1)
-        return postings
+        if term == "!!all!!" and postings:
+            # lets the complement of a result be streamed from a docID range when no docID is missing
+            dictionary[term]["first"] = postings[0]
+            dictionary[term]["last"] = postings[-1]
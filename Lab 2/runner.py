@@ -1,243 +1,573 @@
-import pickle
-from typing import BinaryIO, Tuple
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from typing import BinaryIO, Iterator, Tuple, Union
+from codec import openPostings, streamPostings, toBitmap, fromBitmap, Blocks
+from cache import LRUCache
+from planner import Plan, canonical
+from tracer import Tracer
+
+# docIDs are either a sorted array, a bitmap with the bit of every docID set
+# or the blocks of a posting list that is longer than a block
+DocIDs = Union[array, int, Blocks]
+
+
+class Complement:
+    """
+    Lazy result of a NOT, holding the docIDs that are left out instead of
+    every other docID of the collection
+
+    Parameters:
+        docIDs (DocIDs): The docIDs not in the result
+
+    Attributes:
+        docIDs (DocIDs): Stores input docIDs
+    """
+
+    def __init__(self, docIDs: DocIDs):
+        self.docIDs = docIDs
+
+
+# a result is either docIDs or the complement of them
+Result = Union[array, int, Complement]
 
 
 class Runner:
     """
     Performs boolean retrieval on the query
 
+    Posting lists and intermediate results are sorted arrays of unsigned
+    integer docIDs, or bitmaps for the dense lists, which are combined with
+    each other by bitwise operations on whole integers. Posting lists longer
+    than a block are left on disk and only the blocks that may contain the
+    docIDs of a shorter list are decoded by AND and DIFF. The result of a NOT
+    is kept as a Complement, and the !!all!! list is only read when the
+    answer of a query is a Complement
+
     Parameters:
         post_handle (BinaryIO): The handle for the postings file
         dictionary (dict): Contains terms and their pointers to the posting list
+        postingsCache (LRUCache): Decoded posting lists shared across queries, None to disable
+        resultsCache (LRUCache): Results of subexpressions by canonical form, None to disable
+        tracer (Tracer): Records how each query is evaluated, None to disable
 
     Attributes:
         terms (dict): Stores input dictionary
         postings (BinaryIO): Stores the handle of the postings file
-        notSkip (int): To indicate entry does not have a valid skip pointer
+        postingsCache (LRUCache): Stores the input postingsCache
+        bitmapBytes (LRUCache): Bitmaps and their bytes by the id of the bitmap, as big as the postings cache
+        resultsCache (LRUCache): Stores the input resultsCache
+        tracer (Tracer): Stores the input tracer
     """
 
-    def __init__(self, post_handle: BinaryIO, dictionary: dict):
-        self.notSkip = -1
+    def __init__(self, post_handle: BinaryIO, dictionary: dict, postingsCache: LRUCache = None,
+                 resultsCache: LRUCache = None, tracer: Tracer = None):
         self.terms = dictionary
         self.postings = post_handle
+        self.postingsCache = postingsCache
+        self.bitmapBytes = LRUCache(postingsCache.capacity) if postingsCache is not None else None
+        self.resultsCache = resultsCache
+        self.tracer = tracer
 
-    def execute(self, query: list) -> str:
+    def execute(self, plan: Plan) -> str:
         """
         Performs boolean retrieval on the query
 
         Parameters:
-            query (list): the query in reverse polish notation
+            plan (Plan): the plan of the query made by the Planner
 
         Returns
             out (str): The list of docIDs that satisfies the query
         """
 
-        stack = list()
+        result = self.evaluate(plan)
 
-        while query:
-            token = query.pop(0)
+        if isinstance(result, Complement):
+            result = self.complement(result.docIDs)
 
-            if token == "AND":
-                t1, t2 = self.get(stack.pop(), stack.pop())
-                stack.append(self.AND(t1, t2))
+        elif isinstance(result, int):
+            result = fromBitmap(result)
 
-            elif token == "OR":
-                t1, t2 = self.get(stack.pop(), stack.pop())
-                stack.append(self.OR(t1, t2))
+        elif isinstance(result, Blocks):
+            result = result.decode()
 
-            elif token == "NOT":
-                # find all docIDs NOT in the given docs so need to compare with the !!all!! list
-                t1, t2 = self.get(stack.pop(), '!!all!!')
-                stack.append(self.NOT(t1, t2))
+        return " ".join(map(str, result))
 
-            else:
-                stack.append(token)
+    def evaluate(self, plan: Plan) -> Result:
+        """
+        Evaluates the operands of a plan in order, stopping an AND or DIFF
+        as soon as its intermediate result is empty
+
+        Parameters:
+            plan (Plan): The plan to be evaluated
+
+        Returns:
+            result (Result): The docIDs that satisfy the plan
+        """
+
+        if isinstance(plan, str):
+            return self.getPostings(plan)
+
+        if self.resultsCache is not None:
+            key = canonical(plan)
+            result = self.resultsCache.get(key)
+
+            if result is None:
+                result = self.combine(plan)
+                self.resultsCache.put(key, result, self.sizeOf(result))
+
+            elif self.tracer is not None:
+                self.tracer.operator(plan, self.countOf(result), isinstance(result, Complement), 0.0, cached=True)
+
+            return result
+
+        return self.combine(plan)
 
-        result = stack.pop()
+    def combine(self, plan: Plan) -> Result:
+        """
+        Evaluates an operator of a plan
+
+        Parameters:
+            plan (Plan): The plan to be evaluated, which is not a term
+
+        Returns:
+            result (Result): The docIDs that satisfy the plan
+        """
+
+        operator, operands = plan
+        started = time.perf_counter() if self.tracer is not None else 0.0
+        steps = []
+
+        if operator == "NOT":
+            result = self.negate(self.evaluate(operands[0]))
 
-        if isinstance(result, list):
-            out = " ".join(result)
         else:
-            # Used for cases where the query is just 1 string
-            out = ""
-            for term in self.getPostings(result):
-                docID, skip = self.getID(term)
-                out += str(docID) + " "
+            result = self.evaluate(operands[0])
+
+        for operand in operands[1:]:
+            if operator == "OR":
+                result = self.unite(result, self.evaluate(operand))
 
-        return out.strip()
+            elif not isinstance(result, Complement) and not result:
+                # the remaining lists cannot add to an empty intersection or difference
+                break
+
+            elif operator == "AND":
+                result = self.intersect(result, self.evaluate(operand))
+
+            else:
+                result = self.intersect(result, self.negate(self.evaluate(operand)))
 
-    def AND(self, t1: list, t2: list) -> list:
+            if self.tracer is not None:
+                steps.append(self.countOf(result))
+
+        if self.tracer is not None:
+            seconds = time.perf_counter() - started
+            self.tracer.operator(plan, self.countOf(result), isinstance(result, Complement), seconds, steps)
+
+        return result
+
+    def intersect(self, t1: Result, t2: Result) -> Result:
         """
-        Performs the AND operation on 2 lists
+        Performs the AND operation on 2 results. A list AND a complement is
+        the difference of the list and the left out docIDs, and 2 complements
+        leave out the union of their docIDs
 
         Parameters:
-            t1 (list): The first list
-            t2 (list): The second list
+            t1 (Result): The first result
+            t2 (Result): The second result
 
         Returns:
-           intermediate (list): The list containing docIDs found in both input lists
+            result (Result): The docIDs found in both results
         """
 
-        p1 = 0
+        if isinstance(t1, Complement) and isinstance(t2, Complement):
+            return Complement(self.OR(t1.docIDs, t2.docIDs))
+
+        if isinstance(t1, Complement):
+            t1, t2 = t2, t1
+
+        if isinstance(t2, Complement):
+            return self.DIFF(t1, t2.docIDs)
+
+        return self.AND(t1, t2)
+
+    def unite(self, t1: Result, t2: Result) -> Result:
+        """
+        Performs the OR operation on 2 results. A list OR a complement leaves
+        out the docIDs of the complement that are not in the list, and 2
+        complements leave out the docIDs left out by both
+
+        Parameters:
+            t1 (Result): The first result
+            t2 (Result): The second result
+
+        Returns:
+            result (Result): The docIDs found in either result
+        """
+
+        if isinstance(t1, Complement) and isinstance(t2, Complement):
+            return Complement(self.AND(t1.docIDs, t2.docIDs))
+
+        if isinstance(t1, Complement):
+            t1, t2 = t2, t1
+
+        if isinstance(t2, Complement):
+            return Complement(self.DIFF(t2.docIDs, t1))
+
+        return self.OR(t1, t2)
+
+    def negate(self, t1: Result) -> Result:
+        """
+        Performs the NOT operation on a result without reading the !!all!! list
+
+        Parameters:
+            t1 (Result): The result to be negated
+
+        Returns:
+            result (Result): The complement of a list, or the list left out by a complement
+        """
+
+        if isinstance(t1, Complement):
+            return t1.docIDs
+
+        return Complement(t1)
+
+    def AND(self, t1: DocIDs, t2: DocIDs) -> DocIDs:
+        """
+        Performs the AND operation on 2 lists by walking the shorter list and
+        galloping through the longer one, so the cost grows with the length
+        of the shorter list and only logarithmically with the longer one.
+        Only the blocks of the longer list that may contain a docID of the
+        shorter list are decoded. 2 bitmaps are intersected bitwise, and each
+        docID of a list is looked up in a bitmap
+
+        Parameters:
+            t1 (DocIDs): The first list
+            t2 (DocIDs): The second list
+
+        Returns:
+           intermediate (DocIDs): The list containing docIDs found in both input lists
+        """
+
+        if isinstance(t1, Blocks) and isinstance(t2, Blocks):
+            if len(t1) > len(t2):
+                t1, t2 = t2, t1
+
+            t1 = self.expand(t1)
+
+        if isinstance(t1, Blocks):
+            t1, t2 = t2, t1
+
+        if isinstance(t1, int) and isinstance(t2, int):
+            return t1 & t2
+
+        if isinstance(t1, int):
+            t1, t2 = t2, t1
+
+        if isinstance(t2, int):
+            # once the bytes of the bitmap are cached, the cost grows with the length of the list only
+            return array("I", (doc1 for doc1, found in self.lookup(self.expand(t1), t2) if found))
+
+        if isinstance(t2, Blocks):
+            return array("I", (doc1 for doc1, found in self.probe(t1, t2) if found))
+
+        if len(t1) > len(t2):
+            t1, t2 = t2, t1
+
         p2 = 0
-        intermediate = list()
+        intermediate = array("I")
 
-        while p1 < len(t1) and p2 < len(t2):
+        for doc1 in t1:
+            p2 = self.gallop(t2, doc1, p2)
 
-            doc1, skip1 = self.getID(t1[p1])
-            doc2, skip2 = self.getID(t2[p2])
+            if p2 == len(t2):
+                break
 
-            if doc1 == doc2:
-                intermediate.append(str(doc1))
-                p1 += 1
+            if t2[p2] == doc1:
+                intermediate.append(doc1)
                 p2 += 1
 
-            elif doc1 < doc2:
-                if skip1 != self.notSkip and self.getID(t1[skip1])[0] <= doc2:
-                    while skip1 != self.notSkip and self.getID(t1[skip1])[0] <= doc2:
-                        p1 = skip1
-                        skip1 = self.getID(t1[p1])[1]
-                else:
-                    p1 += 1
-
-            else:  # doc1 > doc2
-                if skip2 != self.notSkip and self.getID(t2[skip2])[0] <= doc1:
-                    while skip2 != self.notSkip and self.getID(t2[skip2])[0] <= doc1:
-                        p2 = skip2
-                        skip2 = self.getID(t2[p2])[1]
-                else:
-                    p2 += 1
-
         return intermediate
 
-    def OR(self, t1: list, t2: list) -> list:
+    def OR(self, t1: DocIDs, t2: DocIDs) -> DocIDs:
         """
-        Performs the OR operation on 2 lists
+        Performs the OR operation on 2 lists, giving a bitmap if either of them is one
 
         Parameters:
-            t1 (list): The first list
-            t2 (list): The second list
+            t1 (DocIDs): The first list
+            t2 (DocIDs): The second list
 
         Returns:
-           intermediate (list): The list containing docIDs found in all input lists
+           intermediate (DocIDs): The list containing docIDs found in all input lists
         """
 
+        if isinstance(t1, int) or isinstance(t2, int):
+            return self.bitmap(t1) | self.bitmap(t2)
+
+        t1 = self.expand(t1)
+        t2 = self.expand(t2)
+
         p1 = 0
         p2 = 0
-        intermediate = list()
+        intermediate = array("I")
 
         while p1 < len(t1) and p2 < len(t2):
 
-            doc1, skip1 = self.getID(t1[p1])
-            doc2, skip2 = self.getID(t2[p2])
+            doc1 = t1[p1]
+            doc2 = t2[p2]
 
             if doc1 == doc2:
-                intermediate.append(str(doc1))
+                intermediate.append(doc1)
                 p1 += 1
                 p2 += 1
 
             elif doc1 < doc2:
-                intermediate.append(str(doc1))
+                intermediate.append(doc1)
                 p1 += 1
 
             else:
-                intermediate.append(str(doc2))
+                intermediate.append(doc2)
                 p2 += 1
 
-        # when there are still docIDs left in list1
-        while p1 < len(t1):
-            doc1, skip1 = self.getID(t1[p1])
-            intermediate.append(str(doc1))
-            p1 += 1
+        # when there are still docIDs left in either list
+        intermediate.extend(t1[p1:])
+        intermediate.extend(t2[p2:])
+
+        return intermediate
+
+    def DIFF(self, t1: DocIDs, t2: DocIDs) -> DocIDs:
+        """
+        Performs the AND NOT operation by walking list t1 and galloping
+        through list t2, decoding only the blocks of t2 that may contain a
+        docID of t1. A list is subtracted from a bitmap bitwise, and each
+        docID of a list is looked up in a bitmap to be subtracted
+
+        Parameters:
+            t1 (DocIDs): The first list
+            t2 (DocIDs): The list to be subtracted
+
+        Returns:
+           intermediate (DocIDs): The list containing docIDs of t1 not found in t2
+        """
+
+        t1 = self.expand(t1)
+
+        if isinstance(t1, int):
+            # the result is no longer than t1, so it stays a bitmap
+            return t1 & ~self.bitmap(t2)
+
+        if isinstance(t2, int):
+            return array("I", (doc1 for doc1, found in self.lookup(t1, t2) if not found))
+
+        if isinstance(t2, Blocks):
+            return array("I", (doc1 for doc1, found in self.probe(t1, t2) if not found))
 
-        # when there are still docIDs left in list2
-        while p2 < len(t2):
-            doc2, skip2 = self.getID(t2[p2])
-            intermediate.append(str(doc2))
-            p2 += 1
+        p2 = 0
+        intermediate = array("I")
+
+        for doc1 in t1:
+            p2 = self.gallop(t2, doc1, p2)
+
+            if p2 == len(t2) or t2[p2] != doc1:
+                intermediate.append(doc1)
 
         return intermediate
 
-    def NOT(self, t1: list, t2: list) -> list:
+    def probe(self, t1: array, t2: Blocks) -> Iterator[Tuple[int, bool]]:
         """
-        Performs the NOT operation on list t1
+        Looks up each docID of list t1 in the blocks of list t2. A block is
+        skipped unless a docID of t1 lies between its first and last docID,
+        and is decoded at most once as t1 is sorted
 
         Parameters:
-            t1 (list): The first list
-            t2 (list): The second list
+            t1 (array): The list of docIDs to be looked up
+            t2 (Blocks): The list to be searched
 
         Returns:
-           intermediate (list): The list containing docIDs not found in list t1
+            lookups (Iterator): Each docID of t1 and whether it is found in t2
         """
 
-        p1 = 0
+        block = -1
+        blocks = len(t2.lasts)
+        docIDs = array("I")
         p2 = 0
-        intermediate = list()
 
-        while p1 < len(t1) and p2 < len(t2):
+        for doc1 in t1:
+            if block < 0 or doc1 > t2.lasts[block]:
+                found = t2.find(doc1, max(block, 0))
 
-            doc1, skip1 = self.getID(t1[p1])
-            doc2, skip2 = self.getID(t2[p2])
+                if self.tracer is not None:
+                    self.tracer.skip(t2, found - block - 1)
 
-            if doc1 == doc2:
-                p1 += 1
-                p2 += 1
+                if found == blocks:
+                    yield doc1, False
+                    continue
 
-            elif doc1 < doc2:
-                intermediate.append(str(doc1))
-                p1 += 1
+                if found != block:
+                    block = found
+                    docIDs = None
 
-            else:
-                intermediate.append(str(doc2))
-                p2 += 1
+            if doc1 < t2.firsts[block]:
+                # falls in the gap before the block
+                yield doc1, False
+                continue
 
-        # when there are still docIDs left in the "!!all!!" list
-        while p2 < len(t2):
-            doc2, skip2 = self.getID(t2[p2])
-            intermediate.append(str(doc2))
-            p2 += 1
+            if docIDs is None:
+                docIDs = t2.block(block)
+                p2 = 0
 
-        return intermediate
+                if self.tracer is not None:
+                    start, end = t2.span(block)
+                    self.tracer.readBlocks(t2, 1, end - start, len(docIDs))
+
+            p2 = self.gallop(docIDs, doc1, p2)
+            yield doc1, p2 < len(docIDs) and docIDs[p2] == doc1
+
+    def lookup(self, t1: array, t2: int) -> Iterator[Tuple[int, bool]]:
+        """
+        Looks up each docID of list t1 in bitmap t2 by testing its bit in
+        the bytes of the bitmap. Converting a bitmap to bytes costs as much as
+        the whole collection, so the bytes are cached for bitmaps that are
+        used again, such as the posting lists held by the postings cache
+
+        Parameters:
+            t1 (array): The list of docIDs to be looked up
+            t2 (int): The bitmap to be searched
+
+        Returns:
+            lookups (Iterator): Each docID of t1 and whether it is found in t2
+        """
+
+        # the cache holds the bitmap itself, so its id is not reused while it is cached
+        cached = self.bitmapBytes.get(id(t2)) if self.bitmapBytes is not None else None
+
+        if cached is not None:
+            data = cached[1]
+        else:
+            data = t2.to_bytes((t2.bit_length() + 7) >> 3, "little")
+
+            if self.bitmapBytes is not None:
+                self.bitmapBytes.put(id(t2), (t2, data), self.sizeOf(t2) + len(data))
+
+        size = len(data)
+
+        for doc1 in t1:
+            yield doc1, doc1 >> 3 < size and data[doc1 >> 3] >> (doc1 & 7) & 1 == 1
+
+    def gallop(self, docIDs: array, target: int, start: int) -> int:
+        """
+        Finds the first position at or after start whose docID is not less
+        than target, doubling the step until target is passed and then
+        binary searching the last step
+
+        Parameters:
+            docIDs (array): The sorted list to be searched
+            target (int): The docID to be found
+            start (int): Position to search from
+
+        Returns:
+            position (int): The position found, len(docIDs) if every docID is smaller
+        """
+
+        step = 1
+        low = start
+        high = start
+
+        while high < len(docIDs) and docIDs[high] < target:
+            low = high + 1
+            high = start + step
+            step *= 2
+
+        return bisect_left(docIDs, target, low, min(high, len(docIDs)))
+
+    def bitmap(self, docIDs: DocIDs) -> int:
+        """
+        Gets the bitmap of a list
+
+        Parameters:
+            docIDs (DocIDs): The list
+
+        Returns:
+            bitmap (int): The list itself if it is a bitmap, otherwise the bitmap of its docIDs
+        """
+
+        if isinstance(docIDs, int):
+            return docIDs
+
+        return toBitmap(self.expand(docIDs))
 
-    def get(self, t1: any, t2: any) -> Tuple[list, list]:
+    def expand(self, docIDs: DocIDs) -> DocIDs:
         """
-        Checks if top of stack is a term or a list and responds appropriately
+        Decodes the blocks of a list that is left on disk
 
         Parameters:
-            t1 (any): Can either be a list or term
-            t2 (any): Can either be a list or term
+            docIDs (DocIDs): The list
 
         Returns:
-            t1 (list): The posting list associated with the first input (t1)
-            t2 (list): The posting list associated with the first input (t2)
+            docIDs (DocIDs): The decoded docIDs if the list is left on disk, otherwise the list itself
         """
-        if not isinstance(t1, list):
-            t1 = self.getPostings(t1)
 
-        if not isinstance(t2, list):
-            t2 = self.getPostings(t2)
+        if isinstance(docIDs, Blocks):
+            if self.tracer is not None:
+                self.tracer.readBlocks(docIDs, len(docIDs.lasts), docIDs.end - docIDs.start, len(docIDs))
 
-        return t1, t2
+            return docIDs.decode()
 
-    def getID(self, entry: str) -> Tuple[int, int]:
+        return docIDs
+
+    def complement(self, docIDs: DocIDs) -> Iterator[int]:
         """
-        Gets the docID and skip pointer (if any) from the entry in the posting list
+        Streams every docID of the collection that is not in the given list
 
         Parameters:
-            entry (str): The docID/docID with skip pointer from the posting list
+            docIDs (DocIDs): The docIDs to be left out
 
         Returns:
-            entry (int): The docID
-            skip (int): The skip pointer (-1 if skip pointer is invalid)
+            complement (Iterator): The remaining docIDs in ascending order
         """
 
-        if "|" in str(entry):
-            docID, skip = entry.split("|")
-            return int(docID), int(skip)
+        if isinstance(docIDs, int):
+            docIDs = fromBitmap(docIDs)
+
+        docIDs = self.expand(docIDs)
+        p1 = 0
+
+        for docID in self.everything():
+            p1 = self.gallop(docIDs, docID, p1)
 
-        return int(entry), self.notSkip
+            if p1 == len(docIDs) or docIDs[p1] != docID:
+                yield docID
 
-    def getPostings(self, key: str) -> list:
+    def everything(self) -> Iterator[int]:
+        """
+        Streams every docID of the collection, from the range between the
+        first and last docID if no docID in between is missing, otherwise
+        by decoding the !!all!! list one docID at a time
+
+        Parameters:
+            None
+
+        Returns:
+            docIDs (Iterator): Every docID in ascending order
+        """
+
+        if "!!all!!" not in self.terms:
+            return iter(())
+
+        entry = self.terms["!!all!!"]
+
+        if entry["last"] - entry["first"] + 1 == entry["count"]:
+            return iter(range(entry["first"], entry["last"] + 1))
+
+        if self.tracer is not None:
+            self.tracer.stream("!!all!!", entry["count"], entry["size"])
+
+        self.postings.seek(entry["ptr"])
+        return streamPostings(self.postings.read(entry["size"]))
+
+    def getPostings(self, key: str) -> DocIDs:
         """
         Gets the relevants posting list from the key
 
@@ -245,15 +575,68 @@ class Runner:
             key (str): The search term
 
         Returns:
-            postingList (list): An empty list if term is not found
-                                The posting list if term is found
+            postingList (DocIDs): An empty list if term is not found
+                                  The posting list if term is found, as a bitmap if it is stored as one
+                                  or as its blocks if it is longer than a block
         """
 
         if key not in self.terms:
-            return list()
+            if self.tracer is not None:
+                self.tracer.read(key, array("I"), 0)
+
+            return array("I")
+
+        if self.postingsCache is not None:
+            postingList = self.postingsCache.get(key)
+
+            if postingList is not None:
+                if self.tracer is not None:
+                    self.tracer.read(key, postingList, 0, cached=True)
+
+                return postingList
 
         # uses absolute value for seek so no need to rewind
-        self.postings.seek(self.terms[key]["ptr"])
-        postingList = pickle.load(self.postings)
+        entry = self.terms[key]
+        postingList = openPostings(self.postings, entry["ptr"], entry["size"])
+
+        if self.tracer is not None:
+            # only the header and skip table of a list left on disk are read
+            size = postingList.start - entry["ptr"] if isinstance(postingList, Blocks) else entry["size"]
+            self.tracer.read(key, postingList, size)
+
+        if self.postingsCache is not None:
+            self.postingsCache.put(key, postingList, self.sizeOf(postingList))
 
         return postingList
+
+    def sizeOf(self, result: Result) -> int:
+        """
+        Gets the bytes used by a result
+
+        Parameters:
+            result (Result): The result to be measured
+
+        Returns:
+            size (int): Bytes used by the result and the docIDs it holds
+        """
+
+        if isinstance(result, Complement):
+            return sys.getsizeof(result) + sys.getsizeof(result.docIDs)
+
+        return sys.getsizeof(result)
+
+    def countOf(self, result: Result) -> int:
+        """
+        Gets the number of docIDs held by a result
+
+        Parameters:
+            result (Result): The result to be counted
+
+        Returns:
+            count (int): Number of docIDs in the result, or left out by it if it is a complement
+        """
+
+        if isinstance(result, Complement):
+            result = result.docIDs
+
+        return self.tracer.size(result)
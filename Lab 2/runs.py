@@ -0,0 +1,74 @@
+import os
+import struct
+from array import array
+from typing import Iterator, Tuple
+
+# term length, number of docIDs
+ENTRY = struct.Struct("=HI")
+
+
+class Run:
+    """
+    A sorted run of terms and their posting lists stored in a binary file.
+    Each entry is the term length and docID count, the utf-8 term and
+    then the docIDs as unsigned 32 bit integers
+
+    Parameters:
+        path (str): file path of the run
+        buffersize (int): Size of the read and write buffers in bytes
+
+    Attributes:
+        path (str): Stores the input path
+        buffersize (int): Stores the input buffersize
+    """
+
+    def __init__(self, path: str, buffersize: int = 1 << 20):
+        self.path = path
+        self.buffersize = buffersize
+
+    def write(self, entries: Iterator[Tuple[str, array]]) -> None:
+        """
+        Writes the entries to the run file
+
+        Parameters:
+            entries (Iterator): (term, docIDs) pairs in ascending term order
+
+        Returns:
+            None
+        """
+        with open(self.path, "wb", buffering=self.buffersize) as runFile:
+            for term, docIDs in entries:
+                encoded = term.encode("utf-8")
+                runFile.write(ENTRY.pack(len(encoded), len(docIDs)))
+                runFile.write(encoded)
+                runFile.write(docIDs.tobytes())
+
+    def entries(self) -> Iterator[Tuple[str, array]]:
+        """
+        Streams the entries of the run file
+
+        Parameters:
+            None
+
+        Returns:
+            entries (Iterator): (term, docIDs) pairs in ascending term order
+        """
+        with open(self.path, "rb", buffering=self.buffersize) as runFile:
+            while (header := runFile.read(ENTRY.size)):
+                length, count = ENTRY.unpack(header)
+                term = runFile.read(length).decode("utf-8")
+                docIDs = array("I")
+                docIDs.frombytes(runFile.read(count * docIDs.itemsize))
+                yield term, docIDs
+
+    def remove(self) -> None:
+        """
+        Deletes the run file
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+        os.remove(self.path)
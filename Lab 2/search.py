@@ -3,75 +3,203 @@ import re
 import nltk
 import sys
 import getopt
-import pickle
+import mmap
+import json
+from typing import Tuple
+from multiprocessing import Pool
 from parser import Parser
+from cache import LRUCache
+from lexicon import Lexicon
+from planner import Planner
 from runner import Runner
+from tracer import Tracer
 
 
-def run_search(dict_file: str, postings_file: str, queries_file: str, results_file: str) -> None:
+def run_search(dict_file: str, postings_file: str, queries_file: str, results_file: str,
+               cachesize: int = 1 << 26, workers: int = 1, chunksize: int = 256, tracefile: str = None) -> None:
     """
     Initialise dictionary with the dict_file, reads queries from queries_file
     finds all documents that contain the given parameters from the query and
     stores them in the results file.
 
+    With more than 1 worker, chunks of queries are evaluated by a pool of
+    worker processes that map the same postings file, and their results
+    are written in the order of the queries
+
+    With a trace file, a JSON record of how each query was evaluated is
+    written to it on its own line, in the order of the queries. A record
+    holds the query in reverse polish notation and its plan, the bytes and
+    entries read and the skip table lookups for each term, and the size,
+    the size after each operand and the wall time of each operator
+
     Parameters:
         dict_file (str): file path for the dictionary file
         postings_file (str): file path for the postings file
         queries_file (str): file path for the queries file
         results_file (str): file path for the results file
+        cachesize (int): Max bytes of each of the postings and subexpression caches of a process, 0 to disable them
+        workers (int): Number of processes evaluating queries
+        chunksize (int): Number of queries sent to a worker at once
+        tracefile (str): file path for the query traces, None to not trace the queries
 
     Returns:
         None
     """
     print("start searching")
 
-    with open(dict_file, "rb") as d:
-        terms = pickle.load(d)
+    with open(queries_file, "r") as queries:
+        queryList = queries.readlines()
 
     results = open(results_file, "w")
-    queries = open(queries_file, "r")
-    postings = open(postings_file, "rb")
+    traces = open(tracefile, "w") if tracefile is not None else None
+    tasks = [queryList[i:i + chunksize] for i in range(0, len(queryList), chunksize)]
+    totals = [0, 0, 0, 0]
+
+    if workers > 1:
+        initargs = (dict_file, postings_file, cachesize, traces is not None)
 
-    parser = Parser()
-    runner = Runner(postings, terms)
+        with Pool(workers, initializer=attach_worker, initargs=initargs) as pool:
+            # imap returns the chunks in submission order
+            for outputs, counts, records in pool.imap(run_queries, tasks):
+                results.writelines(output + "\n" for output in outputs)
+                totals = [total + count for total, count in zip(totals, counts)]
+
+                if traces is not None:
+                    traces.writelines(json.dumps(record) + "\n" for record in records)
+
+    else:
+        attach_worker(dict_file, postings_file, cachesize, traces is not None)
 
-    for query in queries:
-        reversePolish = parser.parse(query)
-        print(runner.execute(reversePolish), file=results)
+        for outputs, counts, records in map(run_queries, tasks):
+            results.writelines(output + "\n" for output in outputs)
+            totals = [total + count for total, count in zip(totals, counts)]
+
+            if traces is not None:
+                traces.writelines(json.dumps(record) + "\n" for record in records)
 
     results.close()
-    queries.close()
-    postings.close()
+
+    if traces is not None:
+        traces.close()
+
+    if cachesize > 0:
+        print("postings cache:", totals[0], "hits,", totals[1], "misses")
+        print("subexpression cache:", totals[2], "hits,", totals[3], "misses")
+
     print("search completed")
 
 
-def usage():
-    print("usage: " +
-          sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results")
-
-
-dictionary_file = postings_file = file_of_queries = output_file_of_results = None
-
-try:
-    opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:')
-except getopt.GetoptError:
-    usage()
-    sys.exit(2)
-
-for o, a in opts:
-    if o == '-d':
-        dictionary_file = a
-    elif o == '-p':
-        postings_file = a
-    elif o == '-q':
-        file_of_queries = a
-    elif o == '-o':
-        file_of_output = a
-    else:
-        assert False, "unhandled option"
+# set up by attach_worker in each process that evaluates queries
+workerParser = None
+workerPlanner = None
+workerRunner = None
+
+
+def attach_worker(dict_file: str, postings_file: str, cachesize: int, trace: bool = False) -> None:
+    """
+    Initialises a process for evaluating queries with read-only memory maps
+    of the dictionary and postings files, whose pages are shared with every
+    other process mapping the files
+
+    Parameters:
+        dict_file (str): file path for the dictionary file
+        postings_file (str): file path for the postings file
+        cachesize (int): Max bytes of each of the postings and subexpression caches, 0 to disable them
+        trace (bool): True to record how each query is evaluated
+
+    Returns:
+        None
+    """
+    global workerParser, workerPlanner, workerRunner
+
+    terms = Lexicon(dict_file)
+
+    with open(postings_file, "rb") as p:
+        postings = mmap.mmap(p.fileno(), 0, access=mmap.ACCESS_READ)
+
+    postingsCache = LRUCache(cachesize) if cachesize > 0 else None
+    resultsCache = LRUCache(cachesize) if cachesize > 0 else None
+
+    workerParser = Parser()
+    workerPlanner = Planner(terms)
+    workerRunner = Runner(postings, terms, postingsCache, resultsCache, Tracer() if trace else None)
+
+
+def run_queries(queryList: list) -> Tuple[list, list, list]:
+    """
+    Evaluates a chunk of queries in the current process
+
+    Parameters:
+        queryList (list): The queries
 
-if dictionary_file == None or postings_file == None or file_of_queries == None or file_of_output == None:
-    usage()
-    sys.exit(2)
+    Returns:
+        outputs (list): The docIDs that satisfy each query
+        counts (list): Hits and misses of the postings cache and of the
+                       subexpression cache while evaluating the chunk
+        records (list): The trace record of each query, empty if the queries are not traced
+    """
+    caches = (workerRunner.postingsCache, workerRunner.resultsCache)
+    before = [count for cache in caches if cache is not None for count in (cache.hits, cache.misses)]
+    tracer = workerRunner.tracer
+    outputs = []
+    records = []
+
+    for query in queryList:
+        reversePolish = workerParser.parse(query)
+        plan = workerPlanner.plan(reversePolish)
+
+        if tracer is not None:
+            tracer.start(query, reversePolish, plan)
+
+        outputs.append(workerRunner.execute(plan))
+
+        if tracer is not None:
+            records.append(tracer.finish(outputs[-1]))
 
-run_search(dictionary_file, postings_file, file_of_queries, file_of_output)
+    after = [count for cache in caches if cache is not None for count in (cache.hits, cache.misses)]
+    counts = [new - old for new, old in zip(after, before)]
+
+    return outputs, counts + [0] * (4 - len(counts)), records
+
+
+def usage():
+    print("usage: " +
+          sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results"
+          + " [-c cache-bytes] [-j workers] [-t trace-file]")
+
+
+if __name__ == '__main__':
+    dictionary_file = postings_file = file_of_queries = output_file_of_results = None
+    cache_size = 1 << 26
+    workers = 1
+    trace_file = None
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:c:j:t:')
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == '-d':
+            dictionary_file = a
+        elif o == '-p':
+            postings_file = a
+        elif o == '-q':
+            file_of_queries = a
+        elif o == '-o':
+            file_of_output = a
+        elif o == '-c':  # bytes of each cache
+            cache_size = int(a)
+        elif o == '-j':  # number of query processes
+            workers = int(a)
+        elif o == '-t':  # file of query traces
+            trace_file = a
+        else:
+            assert False, "unhandled option"
+
+    if dictionary_file == None or postings_file == None or file_of_queries == None or file_of_output == None:
+        usage()
+        sys.exit(2)
+
+    run_search(dictionary_file, postings_file, file_of_queries, file_of_output, cache_size, workers, tracefile=trace_file)
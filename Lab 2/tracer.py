@@ -0,0 +1,212 @@
+import time
+from array import array
+from typing import Union
+from codec import Blocks
+from planner import Plan
+
+
+class Tracer:
+    """
+    Records how the Runner evaluates each query: the bytes and entries read
+    from the posting list of every term, the skip table lookups of the lists
+    left on disk, and the size and wall time of every operator. Records are
+    plain dicts that can be written as JSON
+
+    Parameters:
+        None
+
+    Attributes:
+        record (dict): The record of the query being evaluated, None before the first query
+        names (dict): Terms of the posting lists left on disk by the id of their Blocks
+        started (float): Time the query being evaluated was started at
+    """
+
+    def __init__(self):
+        self.record = None
+        self.names = {}
+        self.started = 0.0
+
+    def start(self, query: str, reversePolish: list, plan: Plan) -> None:
+        """
+        Starts the record of a query
+
+        Parameters:
+            query (str): The query taken from the queries file
+            reversePolish (list): The query in reverse polish notation
+            plan (Plan): The plan of the query made by the Planner
+
+        Returns:
+            None
+        """
+        self.record = {
+            "query": query.strip(),
+            "rpn": reversePolish,
+            "plan": plan,
+            "terms": {},
+            "operators": [],
+            "skips": {"attempted": 0, "taken": 0},
+        }
+        self.names = {}
+        self.started = time.perf_counter()
+
+    def finish(self, output: str) -> dict:
+        """
+        Completes the record of the query
+
+        Parameters:
+            output (str): The docIDs that satisfy the query
+
+        Returns:
+            record (dict): The record of the query
+        """
+        self.record["results"] = len(output.split())
+        self.record["seconds"] = time.perf_counter() - self.started
+        self.names = {}
+        return self.record
+
+    def read(self, term: str, postingList: Union[array, int, Blocks], size: int, cached: bool = False) -> None:
+        """
+        Records a posting list opened for a term. Only the header and the skip
+        table of a list left on disk are read at first, its blocks are
+        recorded by readBlocks as they are read
+
+        Parameters:
+            term (str): The search term
+            postingList (Union[array, int, Blocks]): The posting list of the term
+            size (int): Bytes read from the postings file
+            cached (bool): True if the posting list was taken from the postings cache
+
+        Returns:
+            None
+        """
+        entry = self.entry(term)
+        entry["count"] = self.size(postingList)
+        entry["cached"] = entry["cached"] and cached
+        entry["bytes"] += size
+
+        if isinstance(postingList, Blocks):
+            self.names[id(postingList)] = term
+        elif not cached:
+            entry["entries"] += entry["count"]
+
+    def stream(self, term: str, count: int, size: int) -> None:
+        """
+        Records a posting list that is decoded one docID at a time
+
+        Parameters:
+            term (str): The search term
+            count (int): Number of docIDs in the posting list
+            size (int): Bytes read from the postings file
+
+        Returns:
+            None
+        """
+        entry = self.entry(term)
+        entry["count"] = count
+        entry["cached"] = False
+        entry["bytes"] += size
+        entry["entries"] += count
+
+    def readBlocks(self, blocks: Blocks, count: int, size: int, entries: int) -> None:
+        """
+        Records blocks read from a posting list left on disk
+
+        Parameters:
+            blocks (Blocks): The posting list
+            count (int): Number of blocks read
+            size (int): Bytes read from the postings file
+            entries (int): Number of docIDs decoded
+
+        Returns:
+            None
+        """
+        entry = self.entry(self.names.get(id(blocks), "?"))
+        entry["bytes"] += size
+        entry["entries"] += entries
+        entry["blocksRead"] += count
+
+    def skip(self, blocks: Blocks, passed: int) -> None:
+        """
+        Records a lookup in the skip table of a posting list left on disk
+
+        Parameters:
+            blocks (Blocks): The posting list
+            passed (int): Number of blocks passed over without being read
+
+        Returns:
+            None
+        """
+        entry = self.entry(self.names.get(id(blocks), "?"))
+        entry["skipsAttempted"] += 1
+        self.record["skips"]["attempted"] += 1
+
+        if passed > 0:
+            entry["skipsTaken"] += 1
+            entry["blocksSkipped"] += passed
+            self.record["skips"]["taken"] += 1
+
+    def operator(self, plan: Plan, size: int, complement: bool, seconds: float, steps: list = None,
+                 cached: bool = False) -> None:
+        """
+        Records an operator once it is evaluated. Operators are recorded after
+        their operands, and their time includes the time of their operands
+
+        Parameters:
+            plan (Plan): The plan of the operator
+            size (int): Number of docIDs held by the result, the docIDs left out if it is a complement
+            complement (bool): True if the result is a complement
+            seconds (float): Wall time taken by the operator
+            steps (list): Size of the intermediate result after each operand that was combined
+            cached (bool): True if the result was taken from the subexpression cache
+
+        Returns:
+            None
+        """
+        self.record["operators"].append({
+            "operator": plan[0],
+            "plan": plan,
+            "size": size,
+            "complement": complement,
+            "steps": steps or [],
+            "seconds": seconds,
+            "cached": cached,
+        })
+
+    def entry(self, term: str) -> dict:
+        """
+        Gets the record of a term, adding it on its first use in the query
+
+        Parameters:
+            term (str): The search term
+
+        Returns:
+            entry (dict): The record of the term
+        """
+        if term not in self.record["terms"]:
+            self.record["terms"][term] = {
+                "count": 0,
+                "cached": True,
+                "bytes": 0,
+                "entries": 0,
+                "blocksRead": 0,
+                "skipsAttempted": 0,
+                "skipsTaken": 0,
+                "blocksSkipped": 0,
+            }
+
+        return self.record["terms"][term]
+
+    def size(self, docIDs: Union[array, int, Blocks]) -> int:
+        """
+        Gets the number of docIDs in a list
+
+        Parameters:
+            docIDs (Union[array, int, Blocks]): The docIDs, as a sorted array, a bitmap or blocks
+
+        Returns:
+            size (int): Number of docIDs
+        """
+        if isinstance(docIDs, int):
+            return bin(docIDs).count("1")
+
+        return len(docIDs)
@@ -4,12 +4,15 @@ import nltk
 import sys
 import getopt
 
-import os
 import math
 import pickle
 from string import punctuation
 from collections import Counter
 from nltk.stem import PorterStemmer
+from corpus import Corpus
+
+# number of postings pickled together, so a search can skip the blocks it does not need
+BLOCK = 128
 
 
 def build_index(in_dir: str, out_dict: str, out_postings: str) -> None:
@@ -18,7 +21,7 @@ def build_index(in_dir: str, out_dict: str, out_postings: str) -> None:
     the index into its dictionary, its posting lists and the document lengths.
 
     Parameters:
-        in_dir (str): folder path of reuters training files
+        in_dir (str): folder path of reuters training files, or a tar archive or packed corpus file of them
         out_dir (str): file path for dictionary and document lengths output
         out_postings (str): file path for storing the postings lists
 
@@ -31,38 +34,53 @@ def build_index(in_dir: str, out_dict: str, out_postings: str) -> None:
     terms = {}
     lengths = {}
     porter = PorterStemmer()
-    docList = sorted(map(int, os.listdir(in_dir)))
+    docList = []
+
+    corpus = Corpus(in_dir)
 
-    for docID in docList:
-        print("reading", docID)
+    try:
+        for docID, text in corpus.documents():
+            print("reading", docID)
 
-        tokens = []
-        doc_length = 0
-        file = os.path.join(in_dir, str(docID))
+            tokens = []
+            doc_length = 0
+            docList.append(docID)
 
-        # tokenizes the document
-        with open(file, "r") as f:
-            for sentence in nltk.sent_tokenize(f.read()):
+            # tokenizes the document
+            for sentence in nltk.sent_tokenize(text):
                 tokens.extend(nltk.word_tokenize(sentence))
 
-        # Stems all the tokens then counts their frequencies
-        term_freq = Counter(map(lambda word: porter.stem(word.lower()), tokens))
+            # Stems all the tokens then counts their frequencies
+            term_freq = Counter(map(lambda word: porter.stem(word.lower()), tokens))
 
-        # gets the term weights and appends them to the posting list
-        for term, tf in term_freq.items():
-            log_tf = 1 + math.log(tf, 10)
-            terms.setdefault(term, []).append((docID, log_tf))
-            doc_length += log_tf ** 2
+            # gets the term weights and appends them to the posting list
+            for term, tf in term_freq.items():
+                log_tf = 1 + math.log(tf, 10)
+                terms.setdefault(term, []).append((docID, log_tf))
+                doc_length += log_tf ** 2
 
-        # gets the length of the document
-        lengths[docID] = math.sqrt(doc_length)
+            # gets the length of the document
+            lengths[docID] = math.sqrt(doc_length)
+    finally:
+        corpus.close()
 
     # gets the idf of each term and saves the posting list into the postings file
+    # the impact is the largest normalised weight of the term in any document,
+    # which bounds how much the term can add to the cosine similarity of a document
+    # the posting list is saved in blocks, with the pointer and first docID of each block
     with open(out_postings, "wb") as p:
         for term, postings in terms.items():
             idf = math.log(len(docList) / len(postings), 10)
-            index[term] = {"idf": idf, "ptr": p.tell()}
-            pickle.dump(postings, p)
+            impact = max(log_tf / lengths[docID] for docID, log_tf in postings)
+            ptrs = []
+            firsts = []
+
+            for start in range(0, len(postings), BLOCK):
+                ptrs.append(p.tell())
+                firsts.append(postings[start][0])
+                pickle.dump(postings[start:start + BLOCK], p)
+
+            index[term] = {"idf": idf, "impact": impact, "ptrs": ptrs, "firsts": firsts}
 
     # Save Index and Length[N] into the dictionary file
     with open(out_dict, "wb") as d:
@@ -73,7 +91,7 @@ def build_index(in_dir: str, out_dict: str, out_postings: str) -> None:
 
 
 def usage():
-    print("usage: " + sys.argv[0] + " -i directory-of-documents -d dictionary-file -p postings-file")
+    print("usage: " + sys.argv[0] + " -i directory-or-archive-of-documents -d dictionary-file -p postings-file")
 
 
 input_directory = output_file_dictionary = output_file_postings = None
@@ -7,11 +7,128 @@ import getopt
 import math
 import heapq
 import pickle
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import BinaryIO
 from collections import Counter
 from nltk.stem import PorterStemmer
 
+# relative margin added to the score bounds, so that rounding errors
+# never prune a document that would tie the last of the top k
+SLACK = 1e-9
 
-def run_search(dict_file: str, postings_file: str, queries_file: str, results_file: str) -> None:
+
+class Postings:
+    """
+    Posting list of a term, read from the postings file one block at a time
+    so that the blocks a search skips are neither read nor unpickled. The
+    list is either iterated whole or walked with a cursor that only moves
+    forward
+
+    Parameters:
+        handle (BinaryIO): The handle for the postings file
+        ptrs (list): Pointers to the blocks of the posting list
+        firsts (list): The first docID of each block
+
+    Attributes:
+        handle (BinaryIO): Stores the input handle
+        ptrs (list): Stores the input ptrs
+        firsts (list): Stores the input firsts
+        block (int): Index of the block under the cursor, -1 before the first block is read
+        entries (list): (docID, weight) of the block under the cursor
+        position (int): Position of the cursor in entries
+    """
+
+    def __init__(self, handle: BinaryIO, ptrs: list, firsts: list):
+        self.handle = handle
+        self.ptrs = ptrs
+        self.firsts = firsts
+        self.block = -1
+        self.entries = []
+        self.position = 0
+
+    def __iter__(self):
+        for ptr in self.ptrs:
+            self.handle.seek(ptr)
+            yield from pickle.load(self.handle)
+
+    def current(self) -> tuple:
+        """
+        Gets the posting under the cursor
+
+        Parameters:
+            None
+
+        Returns:
+            posting (tuple): (docID, weight), None once the cursor is past the last posting
+        """
+        return self.entries[self.position] if self.position < len(self.entries) else None
+
+    def next(self) -> tuple:
+        """
+        Moves the cursor to the next posting
+
+        Parameters:
+            None
+
+        Returns:
+            posting (tuple): (docID, weight), None once the cursor is past the last posting
+        """
+        self.position += 1
+
+        if self.position >= len(self.entries):
+            self.open(self.block + 1)
+
+        return self.entries[self.position] if self.position < len(self.entries) else None
+
+    def seek(self, docID: int) -> tuple:
+        """
+        Moves the cursor to the first posting with a docID of at least docID,
+        reading only the block that may hold it
+
+        Parameters:
+            docID (int): The docID to be searched for, no less than the docIDs searched before
+
+        Returns:
+            posting (tuple): (docID, weight), None if every posting left has a smaller docID
+        """
+        if self.position < len(self.entries) and self.entries[self.position][0] >= docID:
+            return self.entries[self.position]
+
+        # the last block starting at or before docID, which is the only one that may hold it
+        block = max(bisect_right(self.firsts, docID) - 1, 0)
+
+        if block > self.block:
+            self.open(block)
+
+        self.position = bisect_left(self.entries, (docID,), self.position)
+
+        if self.position == len(self.entries):
+            self.open(self.block + 1)
+
+        return self.current()
+
+    def open(self, block: int) -> None:
+        """
+        Reads a block and moves the cursor to its first posting
+
+        Parameters:
+            block (int): Index of the block, past the last block to leave the cursor past the last posting
+
+        Returns:
+            None
+        """
+        self.block = block
+        self.position = 0
+        self.entries = []
+
+        if block < len(self.ptrs):
+            self.handle.seek(self.ptrs[block])
+            self.entries = pickle.load(self.handle)
+
+
+def run_search(dict_file: str, postings_file: str, queries_file: str, results_file: str,
+               exhaustive: bool = False) -> None:
     """
     Use cosine similarity to find the top 10 most relevant documents for
     each free text query.
@@ -21,6 +138,8 @@ def run_search(dict_file: str, postings_file: str, queries_file: str, results_fi
         postings_file (str): file path for the postings file
         queries_file (str): file path for the queries file
         results_file (str): file path for the results file
+        exhaustive (bool): True to score every matching document instead of skipping
+                           the documents that cannot be in the top 10
 
     Returns:
         None
@@ -39,39 +158,31 @@ def run_search(dict_file: str, postings_file: str, queries_file: str, results_fi
 
     for query in queries:
 
-        heap = []
-        scores = {}
+        query_terms = []
         terms = nltk.word_tokenize(query.strip())
         term_freq = Counter(map(lambda word: porter.stem(word.lower()), terms))
 
         for term, tf in term_freq.items():
 
-            # finds the idf and the postings list of the term
+            # finds the idf and the postings list of the term, whose blocks are read when needed
             if term in index:
-                posts.seek(index[term]["ptr"])
-                postings = pickle.load(posts)
+                postings = Postings(posts, index[term]["ptrs"], index[term]["firsts"])
                 idf = index[term]["idf"]
+                impact = index[term]["impact"]
 
             else:
                 idf = 0
-                postings = []
+                impact = 0
+                postings = Postings(posts, [], [])
 
             # gets the logarithmic tf and idf in the "lt" of "ltc"
             q_weight = (1 + math.log(tf, 10)) * idf
+            query_terms.append((q_weight, postings, impact))
 
-            # gets the dot product for the documents
-            for docID, d_weight in postings:
-                scores[docID] = scores.get(docID, 0) + q_weight * d_weight
-
-        # gets cosine similarity and push result to heap
-        # negative docID to sort in ascending order
-        for docID, dot_product in scores.items():
-            cos_sim = dot_product / lengths[docID]
-            heapq.heappush(heap, (cos_sim, -docID, docID))
-
-        # gets top 10 results by descending
-        # cosine similarity and ascending docID
-        top_10 = heapq.nlargest(10, heap)
+        if exhaustive:
+            top_10 = rank_exhaustive(query_terms, lengths, 10)
+        else:
+            top_10 = rank_max_score(query_terms, lengths, 10)
 
         # converts answer array to string
         answer = ""
@@ -86,14 +197,163 @@ def run_search(dict_file: str, postings_file: str, queries_file: str, results_fi
     print("search completed")
 
 
+def rank_exhaustive(query_terms: list, lengths: dict, k: int) -> list:
+    """
+    Scores every document that contains a query term, one term at a time
+
+    Parameters:
+        query_terms (list): (q_weight, postings, impact) of each query term in query order
+        lengths (dict): Lengths of the documents by docID
+        k (int): Number of documents to be returned
+
+    Returns:
+        top_k (list): (cos_sim, -docID, docID) of the top k documents by descending
+                      cosine similarity and ascending docID
+    """
+    heap = []
+    scores = {}
+
+    # gets the dot product for the documents
+    for q_weight, postings, _ in query_terms:
+        for docID, d_weight in postings:
+            scores[docID] = scores.get(docID, 0) + q_weight * d_weight
+
+    # gets cosine similarity and push result to heap
+    # negative docID to sort in ascending order
+    for docID, dot_product in scores.items():
+        cos_sim = dot_product / lengths[docID]
+        heapq.heappush(heap, (cos_sim, -docID, docID))
+
+    return heapq.nlargest(k, heap)
+
+
+def rank_max_score(query_terms: list, lengths: dict, k: int) -> list:
+    """
+    Scores the documents one at a time in docID order with MaxScore, giving
+    the same result as rank_exhaustive. The bound of a term is its query
+    weight times its impact, the most it can add to a cosine similarity.
+    Once k documents are held, the terms with the smallest bounds whose
+    bounds add up to no more than the score of the k-th document are non
+    essential: a document only in their postings cannot enter the top k,
+    so candidates are only taken from the postings of the other terms, and
+    the non essential postings are only searched for the candidates until
+    the bound of a candidate is no more than the k-th score. As candidates
+    come in ascending docID order, a document that only ties the k-th
+    score cannot replace it either. Only the blocks of the non essential
+    postings that may hold a candidate are read
+
+    Parameters:
+        query_terms (list): (q_weight, postings, impact) of each query term in query order
+        lengths (dict): Lengths of the documents by docID
+        k (int): Number of documents to be returned
+
+    Returns:
+        top_k (list): (cos_sim, -docID, docID) of the top k documents by descending
+                      cosine similarity and ascending docID
+    """
+    heap = []
+    bounds = [q_weight * impact * (1 + SLACK) for q_weight, _, impact in query_terms]
+    order = sorted(range(len(query_terms)), key=lambda i: bounds[i])
+    cumulative = list(accumulate(bounds[i] for i in order))
+    rank = [0] * len(query_terms)
+
+    for r, i in enumerate(order):
+        rank[i] = r
+
+    # the next posting of each essential term, smallest docID first
+    cursors = []
+
+    for i, (_, postings, _) in enumerate(query_terms):
+        posting = postings.next()
+
+        if posting is not None:
+            cursors.append((posting[0], i, posting[1]))
+
+    heapq.heapify(cursors)
+
+    # terms in order[:essential] are non essential
+    essential = 0
+    threshold = -math.inf
+
+    while cursors:
+
+        # the candidate is the smallest docID left in the postings of the essential terms
+        docID = cursors[0][0]
+        products = {}
+
+        while cursors and cursors[0][0] == docID:
+            _, i, d_weight = cursors[0]
+            q_weight, postings, _ = query_terms[i]
+
+            if rank[i] < essential:
+                # the term has become non essential, so its postings are only searched from now on
+                heapq.heappop(cursors)
+                continue
+
+            products[i] = q_weight * d_weight
+            posting = postings.next()
+
+            if posting is not None:
+                heapq.heapreplace(cursors, (posting[0], i, posting[1]))
+            else:
+                heapq.heappop(cursors)
+
+        if not products:
+            continue
+
+        # searches the non essential postings by descending bound while the document may enter the top k
+        partial = sum(products.values())
+        remaining = cumulative[essential - 1] if essential > 0 else 0
+        pruned = False
+
+        for i in reversed(order[:essential]):
+            if partial / lengths[docID] * (1 + SLACK) + remaining <= threshold:
+                pruned = True
+                break
+
+            q_weight, postings, _ = query_terms[i]
+            posting = postings.seek(docID)
+            remaining -= bounds[i]
+
+            if posting is not None and posting[0] == docID:
+                products[i] = q_weight * posting[1]
+                partial += products[i]
+
+        if pruned or partial / lengths[docID] * (1 + SLACK) <= threshold:
+            continue
+
+        # adds up the dot product in query order, as rank_exhaustive does
+        dot_product = 0
+        for i in sorted(products):
+            dot_product = dot_product + products[i]
+
+        # negative docID to sort in ascending order
+        entry = (dot_product / lengths[docID], -docID, docID)
+
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+        if len(heap) == k:
+            threshold = heap[0][0]
+
+            while essential < len(order) and cumulative[essential] <= threshold:
+                essential += 1
+
+    return sorted(heap, reverse=True)
+
+
 def usage():
-    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results")
+    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results"
+          + " [-e]")
 
 
 dictionary_file = postings_file = file_of_queries = output_file_of_results = None
+exhaustive = False
 
 try:
-    opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:')
+    opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:e')
 except getopt.GetoptError:
     usage()
     sys.exit(2)
@@ -107,6 +367,8 @@ for o, a in opts:
         file_of_queries = a
     elif o == '-o':
         file_of_output = a
+    elif o == '-e':  # score every matching document
+        exhaustive = True
     else:
         assert False, "unhandled option"
 
@@ -114,4 +376,4 @@ if dictionary_file is None or postings_file is None or file_of_queries is None o
     usage()
     sys.exit(2)
 
-run_search(dictionary_file, postings_file, file_of_queries, file_of_output)
+run_search(dictionary_file, postings_file, file_of_queries, file_of_output, exhaustive)